@@ -0,0 +1,95 @@
+from multiprocessing import Pool, RawArray
+import mmap
+import os
+import numpy as np
+import Detection
+
+_recording = None  # Recording view of each worker process, set by _init_worker
+
+
+def _init_worker(source, shape: tuple, dtype: str) -> None:
+    """
+    Maps the shared recording in a worker process, source is either a RawArray or a (filename, offset) memmap
+    :param source: RawArray or tuple
+    :param shape: tuple
+    :param dtype: str
+    :return: None
+    """
+    global _recording
+    if isinstance(source, tuple):
+        _recording = np.memmap(source[0], dtype=dtype, mode="r", offset=source[1], shape=shape)
+    else:
+        _recording = np.frombuffer(source, dtype=dtype).reshape(shape)
+
+
+def _analyse_shard(job: tuple) -> np.ndarray:
+    """
+    Runs the spectral and detection steps on the channels [start, stop) of the shared recording
+    :param job: tuple with the format (start, stop, fs, modulation_frequencies, noise_bins, window)
+    :return: np.ndarray with Detection.RESULT_DTYPE
+    """
+    start, stop, fs, modulation_frequencies, noise_bins, window = job
+    results = Detection.detect_epochs(_recording[start:stop], fs, modulation_frequencies, noise_bins, window)
+    results["channel"] += start
+
+    return results
+
+
+class AnalysisEngine:
+
+    def __init__(self, fs: float, modulation_frequencies: np.ndarray, noise_bins: int = 10, window: str = None,
+                 workers: int = None):
+        """
+        Per channel ASSR analysis sharded across a process pool. The recording is shared with the workers
+        instead of being pickled to each of them: memory mapped recordings are reopened by file name, any other
+        array is copied once into shared memory
+
+        :param fs: float
+        :param modulation_frequencies: np.ndarray, (ears, components), see Detection.detect
+        :param noise_bins: int
+        :param window: str, optional window name
+        :param workers: int, defaults to the number of cores
+        """
+        self.fs = fs
+        self.modulation_frequencies = np.asarray(modulation_frequencies, dtype=np.float64)
+        self.noise_bins = noise_bins
+        self.window = window
+        self.workers = workers or os.cpu_count()
+
+    def run(self, recording: np.ndarray) -> np.ndarray:
+        """
+        Analyses a (channels, epochs, samples) recording, returning the merged detection results
+        :param recording: np.ndarray
+        :return: np.ndarray with Detection.RESULT_DTYPE
+        """
+        n_channels = recording.shape[0]
+        workers = min(self.workers, n_channels)
+        bounds = np.linspace(0, n_channels, workers + 1).astype(int)
+        jobs = [(start, stop, self.fs, self.modulation_frequencies, self.noise_bins, self.window)
+                for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        if workers == 1:
+            return Detection.detect_epochs(recording, self.fs, self.modulation_frequencies, self.noise_bins,
+                                           self.window)
+
+        with Pool(workers, initializer=_init_worker, initargs=self.share(recording)) as pool:
+            shards = pool.map(_analyse_shard, jobs)
+
+        return np.concatenate(shards)
+
+    @staticmethod
+    def share(recording: np.ndarray) -> tuple:
+        """
+        Returns the worker initializer arguments that give every process access to the recording
+        :param recording: np.ndarray
+        :return: tuple
+        """
+        dtype = recording.dtype.str
+
+        if isinstance(recording, np.memmap) and isinstance(recording.base, mmap.mmap):  # Not a view of a memmap
+            return (recording.filename, recording.offset), recording.shape, dtype
+
+        shared = RawArray("b", recording.nbytes)
+        np.frombuffer(shared, dtype=recording.dtype).reshape(recording.shape)[...] = recording
+
+        return shared, recording.shape, dtype
@@ -0,0 +1,76 @@
+"""
+Cross-checks the native and NumPy synthesis backends and measures them side by side.
+
+Run from the AudioApp folder with: python -m Benchmarks.backends
+"""
+import numpy as np
+import PyWave
+from Benchmarks.parallel import make_battery
+from Benchmarks.synthesis import samples_per_second
+
+
+def make_wave(module, buffer_size: int, oscillator: str):
+    """
+    Creates an AFMWave of the backend module with typical ASSR stimulus parameters
+    :param module: PyWave.PyAFM or PyWave.NumPyAFM
+    :param buffer_size: int
+    :param oscillator: str
+    :return: AFMWave
+    """
+    wave = module.AFMWave(1000, 1, buffer_size)
+    wave.setAMFrequency(40)
+    wave.setFMFrequency(40)
+    wave.setAMDepth(1)
+    wave.setFMDepth(0.2)
+    wave.setFS(44100)
+    wave.setOscillator(module.Oscillator.names[oscillator])
+
+    return wave
+
+
+def cases(module, buffer_size: int) -> dict:
+    """
+    Returns the generators compared between backends, each one filling a (buffer_size, 1) float32 array
+    :param module: PyWave.PyAFM or PyWave.NumPyAFM
+    :param buffer_size: int
+    :return: dict
+    """
+    generators = {}
+    for oscillator in ("EXACT", "ACCUMULATOR"):
+        wave = make_wave(module, buffer_size, oscillator)
+        for kind in ("AM", "FM", "AFM"):
+            generators["{} {}".format(kind, oscillator)] = getattr(wave, "get" + kind + "Wave")
+
+    table = make_battery(1, 4)[0]
+    generators["4 components"] = lambda out: module.getMultiToneWave(table, 44100, buffer_size, out)
+    stream = module.AFMStream(table, 44100, buffer_size)
+    generators["4 components stream"] = stream.fill
+
+    return generators
+
+
+def main(sizes: tuple = (2 ** 10, 2 ** 14, 2 ** 18)) -> None:
+
+    if "native" not in PyWave.BACKENDS:
+        print("The native backend is not built, only {} is available".format(PyWave.BACKEND))
+        return
+
+    native, numpy = PyWave.BACKENDS["native"], PyWave.BACKENDS["numpy"]
+    print("active backend: {}".format(PyWave.BACKEND))
+    print("{:>8} {:<22} {:>14} {:>14} {:>9} {:>12}".format("size", "case", "native", "numpy", "ratio", "max error"))
+    for buffer_size in sizes:
+        native_cases, numpy_cases = cases(native, buffer_size), cases(numpy, buffer_size)
+        for name in native_cases:
+            a, b = (np.empty((buffer_size, 1), dtype=np.float32) for i in range(2))
+            native_cases[name](a)
+            numpy_cases[name](b)
+            error = np.abs(a - b).max()
+
+            fast = samples_per_second(lambda: native_cases[name](a), buffer_size)
+            slow = samples_per_second(lambda: numpy_cases[name](b), buffer_size)
+            print("{:>8} {:<22} {:>12.3e}/s {:>12.3e}/s {:>8.1f}x {:>12.2e}".format(buffer_size, name, fast, slow,
+                                                                              fast / slow, error))
+
+
+if __name__ == '__main__':
+    main()
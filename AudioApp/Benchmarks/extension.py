@@ -0,0 +1,87 @@
+"""
+Measures the PyAFM import time and per call overhead, optionally against another build of the module such as the
+former boost::python one.
+
+Run from the AudioApp folder with:
+    python -m Benchmarks.extension
+    python -m Benchmarks.extension --reference /path/to/old/PyAFM.so
+"""
+import argparse
+import subprocess
+import sys
+import timeit
+import numpy as np
+
+LOAD = """
+import importlib.util
+spec = importlib.util.spec_from_file_location("PyAFM", {path!r})
+PyAFM = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(PyAFM)
+"""
+
+
+def import_time(statement: str, repeat: int = 20) -> float:
+    """
+    Returns the median time in seconds of statement in a fresh interpreter that already imported numpy and enum,
+    so only the extension itself is measured
+    :param statement: str
+    :param repeat: int
+    :return: float
+    """
+    script = ("import time, enum, numpy\nstart = time.perf_counter()\n" + statement +
+              "\nprint(time.perf_counter() - start)")
+    times = [float(subprocess.check_output([sys.executable, "-c", script])) for i in range(repeat)]
+
+    return float(np.median(times))
+
+
+def call_overheads(PyAFM, number: int = 100000) -> dict:
+    """
+    Returns the best time per call in seconds of cheap calls, where the binding cost dominates
+    :param PyAFM: module
+    :param number: int
+    :return: dict
+    """
+    wave = PyAFM.AFMWave(1000, 1, 1)
+    wave.setFS(44100)
+    out = np.empty((1, 1), dtype=np.float32)
+    params = np.array([[1000, 40, 1, 0.2, 0, 1]])
+    stream = PyAFM.AFMStream(params, 44100, 1)
+
+    calls = {"getCarrierFrequency()": wave.getCarrierFrequency,
+             "setFS(44100.)": lambda: wave.setFS(44100.),
+             "getAMWave() 1 sample": wave.getAMWave,
+             "getAMWave(out) 1 sample": lambda: wave.getAMWave(out),
+             "getMultiToneWave 1 sample": lambda: PyAFM.getMultiToneWave(params, 44100, 1, out),
+             "AFMStream.fill(out) 1 sample": lambda: stream.fill(out)}
+
+    return {name: min(timeit.repeat(call, number=number, repeat=5)) / number for name, call in calls.items()}
+
+
+def main(argv: list = None) -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reference", help="path of another PyAFM build to compare with")
+    args = parser.parse_args(argv)
+
+    from PyWave import PyAFM
+    paths = {"current": PyAFM.__file__}
+    if args.reference:
+        paths["reference"] = args.reference
+
+    results = {}
+    for name, path in paths.items():  # Both loaded the same way, without the PyWave package
+        namespace = {}
+        exec(LOAD.format(path=path), namespace)
+        results[name] = import_time(LOAD.format(path=path)), call_overheads(namespace["PyAFM"])
+
+    print("{:<30}".format("") + "".join("{:>14}".format(name) for name in results))
+    print("{:<30}".format("import") + "".join("{:>11.2f} ms".format(imported * 1e3)
+                                              for imported, calls in results.values()))
+    for call in results["current"][1]:
+        print("{:<30}".format(call) + "".join("{:>11.0f} ns".format(calls[call] * 1e9)
+                                              for imported, calls in results.values()))
+
+
+if __name__ == '__main__':
+    main()
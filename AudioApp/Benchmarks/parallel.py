@@ -0,0 +1,52 @@
+"""
+Measures the speed-up of PyWave.synthesize_batch against the number of worker threads.
+
+Run from the AudioApp folder with: python -m Benchmarks.parallel
+"""
+import os
+import time
+import numpy as np
+import PyWave
+
+
+def make_battery(n_stimuli: int, n_components: int = 4, seed: int = 0) -> list:
+    """
+    Returns n_stimuli random component tables spanning typical carrier / modulation combinations
+    :param n_stimuli: int
+    :param n_components: int
+    :param seed: int
+    :return: list of np.ndarray
+    """
+    random = np.random.RandomState(seed)
+    battery = []
+    for i in range(n_stimuli):
+        table = np.zeros((n_components, 6))
+        table[:, 0] = random.choice([500, 1000, 2000, 4000], n_components)
+        table[:, 1] = random.uniform(37, 105, n_components)
+        table[:, 2] = 1
+        table[:, 3] = 0.2
+        table[:, 5] = 1 / n_components
+        battery.append(table)
+
+    return battery
+
+
+def main(n_stimuli: int = 64, buffer_size: int = 2 ** 16, fs: float = 44100) -> None:
+
+    battery = make_battery(n_stimuli)
+    out = np.empty((n_stimuli, buffer_size), dtype=np.float32)
+    cores = os.cpu_count()
+
+    print("{} stimuli x {} samples, {} cores".format(n_stimuli, buffer_size, cores))
+    print("{:>8} {:>12} {:>10}".format("workers", "time", "speed-up"))
+    serial = None
+    for workers in sorted({1, 2, 4, 8, cores}):
+        start = time.perf_counter()
+        PyWave.synthesize_batch(battery, fs, buffer_size, out=out, workers=workers)
+        elapsed = time.perf_counter() - start
+        serial = serial or elapsed
+        print("{:>8} {:>10.3f} s {:>9.2f}x".format(workers, elapsed, serial / elapsed))
+
+
+if __name__ == '__main__':
+    main()
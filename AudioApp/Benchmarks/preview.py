@@ -0,0 +1,74 @@
+"""
+Measures the preview PlotWidget frame times for every plotting backend, headless.
+
+Run from the AudioApp folder with: python -m Benchmarks.preview
+"""
+import os
+import time
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+
+def redraw_frame_time(widget, data: np.ndarray, repeat: int) -> float:
+    """
+    Returns the mean time of the former update, clearing the figure and recreating the axes on every call
+    :param widget: PlotWidget
+    :param data: np.ndarray
+    :param repeat: int
+    :return: float
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        widget.figure.clear()
+        ax = widget.figure.add_subplot(111)
+        ax.plot(data, "-")
+        widget.canvas.draw()
+
+    return (time.perf_counter() - start) / repeat
+
+
+def update_frame_time(widget, data: np.ndarray, repeat: int, app: QApplication) -> float:
+    """
+    Returns the mean time of PlotWidget.plot, processing the events and repainting so every update is drawn
+    :param widget: PlotWidget
+    :param data: np.ndarray
+    :param repeat: int
+    :param app: QApplication
+    :return: float
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        widget.plot(data)
+        app.processEvents()
+        widget.canvas.repaint()  # Both backends pay for the paint of the new frame
+
+    return (time.perf_counter() - start) / repeat
+
+
+def main(sizes: tuple = (50, 1025, 16385), repeat: int = 50) -> None:
+
+    app = QApplication.instance() or QApplication([])
+    from window import PlotWidget
+
+    widgets = {"redraw": PlotWidget(backend="matplotlib"), "matplotlib": PlotWidget(backend="matplotlib"),
+               "pyqtgraph": PlotWidget(backend="pyqtgraph")}
+    for widget in widgets.values():
+        widget.resize(400, 300)
+        widget.show()
+    app.processEvents()
+
+    print("{:>8} {:>22} {:>22} {:>22}".format("points", "matplotlib redraw", "matplotlib update",
+                                              widgets["pyqtgraph"].backend + " update"))
+    for size in sizes:
+        data = np.random.random(size)
+        redraw = redraw_frame_time(widgets["redraw"], data, repeat)
+        update = update_frame_time(widgets["matplotlib"], data, repeat, app)
+        fast = update_frame_time(widgets["pyqtgraph"], data, repeat, app)
+        print("{:>8} {:>19.2f} ms {:>19.2f} ms {:>19.2f} ms".format(size, redraw * 1e3, update * 1e3, fast * 1e3))
+
+
+if __name__ == '__main__':
+    main()
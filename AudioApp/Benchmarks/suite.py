@@ -0,0 +1,272 @@
+"""
+Benchmark suite of the hot paths: AFMWave synthesis, multi component and batch synthesis, Calc spectra, the
+session scheduler and the preview PlotWidget. Every case reports its throughput, latency percentiles and peak
+memory, results are written as JSON and can be compared against a stored baseline. Runs headless, the widgets use
+the offscreen Qt platform.
+
+Run from the AudioApp folder with:
+    python -m Benchmarks.suite --output results.json
+    python -m Benchmarks.suite --baseline results.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import Calc
+import PyWave
+import Scheduler
+from Benchmarks.parallel import make_battery
+from Benchmarks.synthesis import make_wave
+
+FS = 44100
+SWEEPS = {"full": {"buffer_sizes": (2 ** 10, 2 ** 14, 2 ** 18, 2 ** 20), "components": (1, 2, 4, 8, 16),
+                   "channels": (1, 2, 8, 32, 64), "points": (50, 1025, 16385), "stimuli": (10, 1000, 10000)},
+          "quick": {"buffer_sizes": (2 ** 10, 2 ** 14), "components": (1, 4), "channels": (1, 8),
+                    "points": (50, 1025), "stimuli": (10, 1000)}}
+GROUPS = ("synthesis", "components", "channels", "fft", "session", "preview")
+
+
+def measure(function, items: int, min_time: float = 0.2, min_repeat: int = 5) -> dict:
+    """
+    Calls function for at least min_time seconds and min_repeat times, then once more under tracemalloc
+    :param function: callable
+    :param items: int, work items per call (samples, points...) for the throughput
+    :param min_time: float
+    :param min_repeat: int
+    :return: dict with throughput in items per second, latency percentiles in seconds and peak memory in bytes
+    """
+    function()  # Warm up caches and lazy initialisations
+    times = []
+    while sum(times) < min_time or len(times) < min_repeat:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = np.array(times)
+    p50, p95, p99 = np.percentile(times, (50, 95, 99))
+    return {"throughput": items / p50, "latency": {"mean": times.mean(), "p50": p50, "p95": p95, "p99": p99,
+                                                  "max": times.max()},
+            "peak_memory": peak, "repeat": len(times)}
+
+
+def synthesis_cases(sweep: dict):
+    """
+    AFMWave.get*Wave against the buffer size, allocating and into a preallocated buffer
+    :param sweep: dict
+    :return: generator of (name, params, function, items)
+    """
+    for buffer_size in sweep["buffer_sizes"]:
+        wave = make_wave(buffer_size)
+        out = np.empty((buffer_size, 1), dtype=np.float32)
+        for kind in ("AM", "FM", "AFM"):
+            generator = getattr(wave, "get" + kind + "Wave")
+            yield "synthesis/" + kind, {"buffer_size": buffer_size}, generator, buffer_size
+            yield "synthesis/" + kind + "_out", {"buffer_size": buffer_size}, lambda g=generator: g(out), buffer_size
+
+
+def component_cases(sweep: dict):
+    """
+    PyWave.synthesize against the number of components, for every output sample type
+    :param sweep: dict
+    :return: generator of (name, params, function, items)
+    """
+    buffer_size = max(sweep["buffer_sizes"])
+    for n_components in sweep["components"]:
+        table = make_battery(1, n_components)[0]
+        yield ("components/synthesize", {"buffer_size": buffer_size, "components": n_components},
+               lambda: PyWave.synthesize(table, FS, buffer_size), buffer_size)
+        for dtype in ("float64", "int16"):
+            yield ("components/synthesize_" + dtype, {"buffer_size": buffer_size, "components": n_components},
+                   lambda dtype=dtype: PyWave.synthesize(table, FS, buffer_size, dtype=dtype), buffer_size)
+
+
+def channel_cases(sweep: dict):
+    """
+    Batch synthesis, interleaved synthesis and epoch spectra against the number of channels
+    :param sweep: dict
+    :return: generator of (name, params, function, items)
+    """
+    buffer_size = min(max(sweep["buffer_sizes"]), 2 ** 14)
+    for channels in sweep["channels"]:
+        battery = make_battery(channels)
+        out = np.empty((channels, buffer_size), dtype=np.float32)
+        yield ("channels/synthesize_batch", {"buffer_size": buffer_size, "channels": channels},
+               lambda: PyWave.synthesize_batch(battery, FS, buffer_size, out=out), channels * buffer_size)
+        frames = np.empty((buffer_size, channels), dtype=np.float32)
+        yield ("channels/synthesize_channels", {"buffer_size": buffer_size, "channels": channels},
+               lambda: PyWave.synthesize_channels(battery, FS, buffer_size, out=frames), channels * buffer_size)
+
+        epochs = np.random.RandomState(0).standard_normal((channels, 8, buffer_size)).astype(np.float32)
+        yield ("channels/calc_spectra", {"buffer_size": buffer_size, "channels": channels, "epochs": 8},
+               lambda: Calc.calc_spectra(epochs, FS, average="complex"), epochs.size)
+
+
+def fft_cases(sweep: dict):
+    """
+    Calc.calc_fft and Calc.calc_rfft against the buffer size
+    :param sweep: dict
+    :return: generator of (name, params, function, items)
+    """
+    for buffer_size in sweep["buffer_sizes"]:
+        wave = make_wave(buffer_size).getAFMWave()
+        magnitude = np.empty(buffer_size // 2 + 1)
+        yield "fft/calc_fft", {"buffer_size": buffer_size}, lambda: Calc.calc_fft(wave, buffer_size, FS), buffer_size
+        yield ("fft/calc_rfft", {"buffer_size": buffer_size},
+               lambda: Calc.calc_rfft(wave, buffer_size, FS, out=magnitude), buffer_size)
+
+
+def session_cases(sweep: dict):
+    """
+    SessionScheduler start up against the number of distinct stimuli, 3 shuffled repetitions each, and the
+    rendering of its blocks
+    :param sweep: dict
+    :return: generator of (name, params, function, items)
+    """
+    block_size = min(sweep["buffer_sizes"])
+    for n_stimuli in sweep["stimuli"]:
+        stimuli = [[table[:1], table[1:2]] for table in make_battery(n_stimuli, 2)]
+
+        def start(stimuli=stimuli):
+            return next(Scheduler.SessionScheduler(stimuli, FS, 0.5, 3, gap=0.1, order="blocked").blocks(block_size))
+
+        yield "session/start", {"block_size": block_size, "stimuli": n_stimuli}, start, 3 * n_stimuli
+
+    session = Scheduler.SessionScheduler([[table[:1], table[1:2]] for table in make_battery(4, 2)], FS, 0.5, 1000,
+                                         gap=0.1, order="random")
+    blocks = session.blocks(block_size)
+    yield "session/blocks", {"block_size": block_size}, lambda: next(blocks), block_size
+
+
+def preview_cases(sweep: dict):
+    """
+    PlotWidget.plot against the number of points for every plotting backend, the events are processed and the
+    canvas repainted so every update is drawn on screen
+    :param sweep: dict
+    :return: generator of (name, params, function, items)
+    """
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from window import PlotWidget
+
+    for backend in ("matplotlib", "pyqtgraph"):
+        widget = PlotWidget(backend=backend)
+        if widget.backend != backend:  # pyqtgraph is optional
+            continue
+        widget.resize(400, 300)
+        widget.show()
+        app.processEvents()
+
+        for points in sweep["points"]:
+            data = np.random.random(points)
+
+            def update(widget=widget, data=data):
+                widget.plot(data)
+                app.processEvents()
+                widget.canvas.repaint()  # Both backends pay for the paint of the new frame
+
+            yield "preview/" + backend, {"points": points}, update, points
+
+
+CASES = {"synthesis": synthesis_cases, "components": component_cases, "channels": channel_cases,
+         "fft": fft_cases, "session": session_cases, "preview": preview_cases}
+
+
+def case_key(name: str, params: dict) -> str:
+
+    return name + "[" + ",".join("{}={}".format(key, params[key]) for key in sorted(params)) + "]"
+
+
+def run(groups: tuple = GROUPS, sweep: str = "full", min_time: float = 0.2) -> dict:
+    """
+    Runs the benchmark cases of groups, printing one line per case
+    :param groups: tuple of str
+    :param sweep: str, "full" or "quick"
+    :param min_time: float
+    :return: dict, the JSON report
+    """
+    results = []
+    print("{:<60} {:>14} {:>10} {:>10} {:>10} {:>10}".format("case", "throughput", "p50 ms", "p95 ms", "p99 ms",
+                                                              "peak MiB"))
+    for group in groups:
+        for name, params, function, items in CASES[group](SWEEPS[sweep]):
+            result = measure(function, items, min_time)
+            result.update({"key": case_key(name, params), "name": name, "params": params})
+            results.append(result)
+
+            latency = result["latency"]
+            print("{:<60} {:>12.3e}/s {:>10.3f} {:>10.3f} {:>10.3f} {:>10.2f}".format(
+                result["key"], result["throughput"], latency["p50"] * 1e3, latency["p95"] * 1e3,
+                latency["p99"] * 1e3, result["peak_memory"] / 2 ** 20))
+
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                     "cpu_count": os.cpu_count(), "sweep": sweep, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold: float = 0.1) -> list:
+    """
+    Compares the median latency and the peak memory of every case also present in the baseline
+    :param report: dict
+    :param baseline: dict
+    :param threshold: float, relative increase counted as a regression, 0.1 is 10 %
+    :return: list of dict, the regressions
+    """
+    previous = {result["key"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get(result["key"])
+        if before is None:
+            continue
+        for metric, now, then in (("p50", result["latency"]["p50"], before["latency"]["p50"]),
+                                  ("peak_memory", result["peak_memory"], before["peak_memory"])):
+            change = now / then - 1 if then else 0.
+            if change > threshold:
+                regressions.append({"key": result["key"], "metric": metric, "baseline": then, "current": now,
+                                    "change": change})
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--quick", action="store_true", help="smaller sweeps")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent on each case")
+    parser.add_argument("--output", help="JSON results file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative regression threshold")
+    args = parser.parse_args(argv)
+
+    report = run(tuple(args.groups), "quick" if args.quick else "full", args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        print()
+        for regression in regressions:
+            print("REGRESSION {key} {metric}: {baseline:.4g} -> {current:.4g} (+{change:.0%})".format(**regression))
+        print("{} regressions over {:.0%}".format(len(regressions), args.threshold))
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Measures the AFMWave generators throughput in samples per second.
+
+Run from the AudioApp folder with: python -m Benchmarks.synthesis
+"""
+import time
+import numpy as np
+import PyWave
+from PyWave.NumPyAFM import OSCILLATORS
+
+
+def make_wave(buffer_size: int) -> PyWave.AFMWave:
+    """
+    Creates an AFMWave of the active backend with typical ASSR stimulus parameters
+    :param buffer_size: int
+    :return: AFMWave
+    """
+    wave = PyWave.AFMWave(1000, 1, buffer_size)
+    wave.setAMFrequency(40)
+    wave.setFMFrequency(40)
+    wave.setAMDepth(1)
+    wave.setFMDepth(0.2)
+    wave.setFS(44100)
+
+    return wave
+
+
+def samples_per_second(function, buffer_size: int, min_time: float = 0.2) -> float:
+    """
+    Calls function repeatedly for at least min_time seconds and returns the best observed throughput
+    :param function: callable
+    :param buffer_size: int
+    :param min_time: float
+    :return: float
+    """
+    best = float("inf")
+    elapsed = 0.
+    while elapsed < min_time:
+        start = time.perf_counter()
+        function()
+        duration = time.perf_counter() - start
+        best = min(best, duration)
+        elapsed += duration
+
+    return buffer_size / best
+
+
+def oscillators(buffer_size: int = 2 ** 20) -> None:
+    """
+    Prints the AFM throughput and the accuracy of every oscillator backend, the table and rotator oscillators only
+    exist in the native backend
+    :param buffer_size: int
+    :return: None
+    """
+    wave = make_wave(buffer_size)
+    out = np.empty((buffer_size, 1), dtype=np.float32)
+
+    print("{:>14} {:>16} {:>12}".format("oscillator", "AFM out=", "max error"))
+    for name, oscillator in sorted(PyWave.Oscillator.names.items(), key=lambda item: int(item[1])):
+        if PyWave.BACKEND != "native" and oscillator not in OSCILLATORS:
+            print("{:>14} {:>16} {:>12}".format(name, "native only", "-"))
+            continue
+        wave.setOscillator(oscillator)
+        throughput = samples_per_second(lambda: wave.getAFMWave(out), buffer_size)
+        print("{:>14} {:>14.3e}/s {:>12.2e}".format(name, throughput, PyWave.getOscillatorError(oscillator)))
+
+
+def main() -> None:
+
+    print("{:>10} {:>8} {:>16} {:>16}".format("size", "method", "allocating", "out="))
+    for exponent in range(10, 25):
+        buffer_size = 2 ** exponent
+        wave = make_wave(buffer_size)
+        out = np.empty((buffer_size, 1), dtype=np.float32)
+
+        for method in ("getAMWave", "getFMWave", "getAFMWave"):
+            generator = getattr(wave, method)
+            allocating = samples_per_second(generator, buffer_size)
+            preallocated = samples_per_second(lambda: generator(out), buffer_size)
+            print("{:>10} {:>8} {:>14.3e}/s {:>14.3e}/s".format("2^%d" % exponent, method[3:-4],
+                                                                allocating, preallocated))
+
+    print()
+    oscillators()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 from scipy.fftpack import fft
+from scipy.signal import get_window
+from functools import lru_cache
 import numpy as np
 
+FFT_CACHE_SIZE = 32  # Number of frequency axes and windows kept by the lru caches
+
 
 def calc_fft(array: np.ndarray, size: int, fs: float) -> (np.ndarray, np.ndarray):
     """
     Calculates the Fast Fourier Transform and the new x axis values
-    :param array: np.ndarray
+    :param array: np.ndarray, size samples, 1-D or (size, 1)
     :param size: int
     :param fs: float
     :return: tuple with the format (np.ndarray, np.ndarray)
@@ -16,3 +20,278 @@ def calc_fft(array: np.ndarray, size: int, fs: float) -> (np.ndarray, np.ndarray
     frq = k / t
 
     return frq, yf
+
+
+@lru_cache(maxsize=FFT_CACHE_SIZE)
+def rfft_frequencies(size: int, fs: float) -> np.ndarray:
+    """
+    Returns the read-only one-sided frequency axis of a size points real FFT, cached per (size, fs)
+    :param size: int
+    :param fs: float
+    :return: np.ndarray
+    """
+    frq = np.arange(size // 2 + 1) * (fs / size)
+    frq.flags.writeable = False
+
+    return frq
+
+
+def calc_rfft(array: np.ndarray, size: int, fs: float, out: np.ndarray = None) -> (np.ndarray, np.ndarray,
+                                                                                      np.ndarray):
+    """
+    Calculates the one-sided Fast Fourier Transform of a real signal, its magnitude and the x axis values. The
+    transform runs in double precision, float64 input is used without a conversion copy
+    :param array: np.ndarray, size samples, 1-D or (size, 1)
+    :param size: int
+    :param fs: float
+    :param out: np.ndarray, optional float buffer of size // 2 + 1 values that receives the magnitude
+    :return: tuple with the format (np.ndarray, np.ndarray, np.ndarray)
+    """
+    yf = np.fft.rfft(array.reshape(size))
+    magnitude = np.abs(yf, out=out)
+
+    return rfft_frequencies(size, fs), yf, magnitude
+
+
+@lru_cache(maxsize=FFT_CACHE_SIZE)
+def spectral_window(window: str, size: int) -> np.ndarray:
+    """
+    Returns the read-only periodic window of size points scaled to unit coherent gain, cached per (window, size)
+    :param window: str, any scipy.signal.get_window name
+    :param size: int
+    :return: np.ndarray
+    """
+    w = get_window(window, size)
+    w *= size / w.sum()
+    w.flags.writeable = False
+
+    return w
+
+
+def calc_spectra(epochs: np.ndarray, fs: float, axis: int = -1, window: str = None, average: str = None,
+                 epoch_axis: int = -2) -> (np.ndarray, np.ndarray):
+    """
+    Calculates the one-sided spectra of every epoch in a single vectorized call.
+    epochs is usually (epochs, samples) or (channels, epochs, samples), the FFT runs along axis.
+    When average is "complex" the spectra are coherently averaged along epoch_axis, when it is "power"
+    the squared magnitudes are averaged instead, otherwise every spectrum is returned
+    :param epochs: np.ndarray
+    :param fs: float
+    :param axis: int
+    :param window: str, optional window name, see spectral_window
+    :param average: str, None, "complex" or "power"
+    :param epoch_axis: int
+    :return: tuple with the format (np.ndarray, np.ndarray)
+    """
+    size = epochs.shape[axis]
+
+    if window is not None:
+        shape = [1] * epochs.ndim
+        shape[axis] = size
+        epochs = epochs * spectral_window(window, size).reshape(shape)
+
+    spectra = np.fft.rfft(epochs, axis=axis)
+
+    if average == "complex":
+        spectra = spectra.mean(axis=epoch_axis)
+    elif average == "power":
+        power = np.abs(spectra)
+        spectra = np.square(power, out=power).mean(axis=epoch_axis)
+    elif average is not None:
+        raise ValueError("average must be None, 'complex' or 'power'")
+
+    return rfft_frequencies(size, fs), spectra
+
+
+class EpochAccumulator:
+
+    def __init__(self, epoch_shape: tuple, fs: float):
+        """
+        Running averages of stimulus epochs, epochs can be added one at a time or in blocks and the results read at
+        any point. Memory only depends on the epoch shape, never on the number of epochs added
+
+        :param epoch_shape: tuple, shape of one epoch, e.g. (samples,) or (channels, samples)
+        :param fs: float
+        """
+        self.epoch_shape = tuple(epoch_shape)
+        self.fs = fs
+        self.count = 0
+        self.weight = 0.  # Sum of the epoch weights, an array when the weights differ across the leading epoch axes
+        self._weight2 = 0.  # Sum of the squared epoch weights
+
+        spectrum_shape = self.epoch_shape[:-1] + (self.epoch_shape[-1] // 2 + 1,)
+
+        self.mean = np.zeros(self.epoch_shape)  # time domain mean
+        self.spectrum_mean = np.zeros(spectrum_shape, dtype=np.complex128)  # complex (coherent) spectrum mean
+        self._m2 = np.zeros(self.epoch_shape)  # sums of squared deviations, Welford / Chan et al.
+        self._spectrum_m2 = np.zeros(spectrum_shape)
+
+    def add(self, epochs: np.ndarray, weights: np.ndarray = None) -> None:
+        """
+        Adds one epoch with shape epoch_shape or a block of epochs with shape (n,) + epoch_shape. Weighted epochs
+        give weighted means, weights has shape (n,) or (n,) + epoch_shape[:-1] for per channel weights
+        :param epochs: np.ndarray
+        :param weights: np.ndarray, optional non negative epoch weights, e.g. Rejection.EpochRejector weights
+        :return: None
+        """
+        if epochs.shape == self.epoch_shape:
+            epochs = epochs[np.newaxis]
+            if weights is not None:
+                weights = np.asarray(weights)[np.newaxis]
+        if epochs.shape[1:] != self.epoch_shape:
+            raise ValueError("epochs must have shape {} or (n,) + {}".format(self.epoch_shape, self.epoch_shape))
+
+        n = epochs.shape[0]
+        if n == 0:
+            return
+
+        if weights is None:
+            weights = np.ones((n,) + (1,) * len(self.epoch_shape))
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            weights = weights.reshape(weights.shape + (1,) * (epochs.ndim - weights.ndim))
+
+        block_weight = weights.sum(axis=0)
+
+        spectra = np.fft.rfft(epochs, axis=-1)
+        self._merge(self.mean, self._m2, epochs, weights, block_weight)
+        self._merge(self.spectrum_mean, self._spectrum_m2, spectra, weights, block_weight)
+        self.weight = self.weight + block_weight
+        self._weight2 = self._weight2 + (weights * weights).sum(axis=0)
+        self.count += n
+
+    def _merge(self, mean: np.ndarray, m2: np.ndarray, block: np.ndarray, weights: np.ndarray,
+               block_weight: np.ndarray) -> None:
+        """
+        Merges the weighted block statistics into mean and m2 in place
+        :param mean: np.ndarray
+        :param m2: np.ndarray
+        :param block: np.ndarray
+        :param weights: np.ndarray, broadcastable to block
+        :param block_weight: np.ndarray, sum of weights
+        :return: None
+        """
+        tiny = np.finfo(np.float64).tiny  # Channels whose epochs all weigh 0 are left unchanged
+        block_mean = (block * weights).sum(axis=0) / np.maximum(block_weight, tiny)
+        deviation = block - block_mean
+        block_m2 = ((deviation * deviation.conj()).real * weights).sum(axis=0)
+
+        delta = block_mean - mean
+        total = np.maximum(self.weight + block_weight, tiny)
+        mean += delta * (block_weight / total)
+        m2 += block_m2 + (delta * delta.conj()).real * (self.weight * block_weight / total)
+
+    def reset(self) -> None:
+        """
+        Discards every epoch added so far
+        :return: None
+        """
+        self.count = 0
+        self.weight = 0.
+        self._weight2 = 0.
+        for array in (self.mean, self.spectrum_mean, self._m2, self._spectrum_m2):
+            array.fill(0)
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        """
+        One-sided frequency axis of spectrum_mean
+        :return: np.ndarray
+        """
+        return rfft_frequencies(self.epoch_shape[-1], self.fs)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """
+        Unbiased time domain variance across the epochs
+        :return: np.ndarray
+        """
+        return self._m2 / self._dof()
+
+    @property
+    def spectrum_variance(self) -> np.ndarray:
+        """
+        Unbiased variance of the complex spectra across the epochs, the noise power estimate of each bin
+        :return: np.ndarray
+        """
+        return self._spectrum_m2 / self._dof()
+
+    def _dof(self):
+        """
+        Effective degrees of freedom of the weighted epochs, count - 1 when every weight is 1
+        :return: float or np.ndarray
+        """
+        if self.count < 2:
+            return 1.
+        tiny = np.finfo(np.float64).tiny
+        return np.maximum(self.weight - self._weight2 / np.maximum(self.weight, tiny), tiny)
+
+
+@lru_cache(maxsize=FFT_CACHE_SIZE)
+def dft_basis(size: int, fs: float, frequencies: tuple) -> np.ndarray:
+    """
+    Returns the read-only (size, K) complex exponentials that evaluate the DFT at the given frequencies
+    :param size: int
+    :param fs: float
+    :param frequencies: tuple of float
+    :return: np.ndarray
+    """
+    cycles = np.outer(np.arange(size), np.asarray(frequencies) / fs)
+    basis = np.exp(-2j * np.pi * (cycles % 1))
+    basis.flags.writeable = False
+
+    return basis
+
+
+def calc_bins(epochs: np.ndarray, fs: float, frequencies, axis: int = -1) -> np.ndarray:
+    """
+    Evaluates the spectrum only at the given frequencies, which need not fall on FFT bins, in O(N K).
+    The values are scaled like calc_spectra, the frequency axis is moved to the last position
+    :param epochs: np.ndarray
+    :param fs: float
+    :param frequencies: sequence of float
+    :param axis: int
+    :return: np.ndarray
+    """
+    epochs = np.moveaxis(epochs, axis, -1)
+
+    return epochs @ dft_basis(epochs.shape[-1], fs, tuple(frequencies))
+
+
+class BinTracker:
+
+    def __init__(self, frequencies, fs: float, shape: tuple = ()):
+        """
+        Incremental evaluation of the spectrum at a few known frequencies, updated as sample chunks arrive
+
+        :param frequencies: sequence of float
+        :param fs: float
+        :param shape: tuple, leading shape of the chunks, e.g. (channels,)
+        """
+        self.frequencies = tuple(frequencies)
+        self.fs = fs
+        self.n_samples = 0
+        self.values = np.zeros(tuple(shape) + (len(self.frequencies),), dtype=np.complex128)
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        Adds a chunk with shape shape + (samples,) and returns the updated values
+        :param chunk: np.ndarray
+        :return: np.ndarray
+        """
+        size = chunk.shape[-1]
+        cycles = np.asarray(self.frequencies) * self.n_samples / self.fs
+        rotation = np.exp(-2j * np.pi * (cycles % 1))  # phase of the chunk's first sample
+
+        self.values += (chunk @ dft_basis(size, self.fs, self.frequencies)) * rotation
+        self.n_samples += size
+
+        return self.values
+
+    def reset(self) -> None:
+        """
+        Restarts the evaluation, e.g. at an epoch boundary
+        :return: None
+        """
+        self.n_samples = 0
+        self.values.fill(0)
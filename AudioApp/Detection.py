@@ -0,0 +1,98 @@
+from scipy.stats import f as f_distribution
+import numpy as np
+import Calc
+
+# One row per (channel, ear, component) with a configured modulation frequency
+RESULT_DTYPE = np.dtype([("channel", np.int16), ("ear", np.int8), ("component", np.int8),
+                         ("frequency", np.float32), ("bin", np.int32), ("amplitude", np.float32),
+                         ("f_statistic", np.float32), ("f_pvalue", np.float32),
+                         ("coherence", np.float32), ("coherence_pvalue", np.float32),
+                         ("t2", np.float32), ("t2_pvalue", np.float32)])
+
+
+def detect(spectra: np.ndarray, frq: np.ndarray, modulation_frequencies: np.ndarray,
+           noise_bins: int = 10) -> np.ndarray:
+    """
+    Evaluates the ASSR detection statistics at every configured modulation frequency, channel and ear at once:
+    spectral F-test of the averaged spectrum against noise_bins neighbouring bins on each side, minus the bins of
+    the other modulation frequencies, magnitude squared coherence and Hotelling T^2 of the epoch spectra
+    :param spectra: np.ndarray, complex epoch spectra (channels, epochs, bins) or (epochs, bins), see Calc.calc_spectra
+    :param frq: np.ndarray, frequency axis of the spectra
+    :param modulation_frequencies: np.ndarray, (ears, components) or (components,), values <= 0 or nan are skipped
+    :param noise_bins: int
+    :return: np.ndarray with RESULT_DTYPE
+    """
+    if spectra.ndim == 2:
+        spectra = spectra[np.newaxis]
+    modulation_frequencies = np.atleast_2d(np.asarray(modulation_frequencies, dtype=np.float64))
+
+    n_channels, n_epochs, n_bins = spectra.shape
+    ears, components = np.nonzero(np.nan_to_num(modulation_frequencies) > 0)
+    frequencies = modulation_frequencies[ears, components]
+    bins = np.rint(frequencies / (frq[1] - frq[0])).astype(np.intp)
+    valid = (bins > 0) & (bins < n_bins)
+    ears, components, frequencies, bins = ears[valid], components[valid], frequencies[valid], bins[valid]
+
+    epochs = spectra[:, :, bins]  # (channels, epochs, frequencies)
+    average = spectra.mean(axis=1)  # (channels, bins)
+
+    # Spectral F-test, signal power against the mean power of the neighbouring bins. The bins of every configured
+    # modulation frequency are left out of the noise, close multi-ASSR responses would count as noise otherwise
+    offsets = np.concatenate((np.arange(-noise_bins, 0), np.arange(1, noise_bins + 1)))
+    neighbours = np.clip(bins[:, np.newaxis] + offsets, 1, n_bins - 1)
+    noise = ~np.isin(neighbours, bins)  # (frequencies, 2 * noise_bins)
+    n_noise = noise.sum(axis=-1)
+    power = np.square(np.abs(average))
+    signal_power = power[:, bins]
+    with np.errstate(divide="ignore", invalid="ignore"):  # nan without any noise bin left
+        noise_power = np.where(noise, power[:, neighbours], 0).sum(axis=-1) / n_noise
+        f_statistic = signal_power / noise_power
+        f_pvalue = f_distribution.sf(f_statistic, 2, 2 * n_noise)
+
+    # Magnitude squared coherence of the epoch phasors
+    total = np.abs(epochs.sum(axis=1))
+    coherence = np.square(total) / (n_epochs * np.square(np.abs(epochs)).sum(axis=1))
+    coherence_pvalue = np.power(1 - coherence, n_epochs - 1)
+
+    # Hotelling T^2 of the (real, imaginary) epoch pairs, with the 2 x 2 covariance inverted analytically
+    mean = epochs.mean(axis=1)
+    deviation = epochs - mean[:, np.newaxis]
+    s_rr = np.square(deviation.real).sum(axis=1) / (n_epochs - 1)
+    s_ii = np.square(deviation.imag).sum(axis=1) / (n_epochs - 1)
+    s_ri = (deviation.real * deviation.imag).sum(axis=1) / (n_epochs - 1)
+    determinant = s_rr * s_ii - np.square(s_ri)
+    t2 = n_epochs * (np.square(mean.real) * s_ii - 2 * mean.real * mean.imag * s_ri +
+                     np.square(mean.imag) * s_rr) / determinant
+    t2_pvalue = f_distribution.sf(t2 * (n_epochs - 2) / (2 * (n_epochs - 1)), 2, n_epochs - 2)
+
+    results = np.empty((n_channels, len(bins)), dtype=RESULT_DTYPE)
+    results["channel"] = np.arange(n_channels)[:, np.newaxis]
+    results["ear"] = ears
+    results["component"] = components
+    results["frequency"] = frequencies
+    results["bin"] = bins
+    results["amplitude"] = np.abs(mean)
+    results["f_statistic"] = f_statistic
+    results["f_pvalue"] = f_pvalue
+    results["coherence"] = coherence
+    results["coherence_pvalue"] = coherence_pvalue
+    results["t2"] = t2
+    results["t2_pvalue"] = t2_pvalue
+
+    return results.reshape(-1)
+
+
+def detect_epochs(epochs: np.ndarray, fs: float, modulation_frequencies: np.ndarray, noise_bins: int = 10,
+                  window: str = None) -> np.ndarray:
+    """
+    Computes the epoch spectra with Calc.calc_spectra and evaluates the detection statistics, see detect
+    :param epochs: np.ndarray, (channels, epochs, samples) or (epochs, samples)
+    :param fs: float
+    :param modulation_frequencies: np.ndarray, (ears, components) or (components,)
+    :param noise_bins: int
+    :param window: str, optional window name
+    :return: np.ndarray with RESULT_DTYPE
+    """
+    frq, spectra = Calc.calc_spectra(epochs, fs, window=window)
+
+    return detect(spectra, frq, modulation_frequencies, noise_bins)
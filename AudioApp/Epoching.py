@@ -0,0 +1,130 @@
+import numpy as np
+
+CHUNK_FRAMES = 65536  # Frames read at a time from arrays and memory mapped files
+
+
+class Epocher:
+
+    def __init__(self, fs: float, duration: float, channels: int, block_epochs: int = 10, dtype=np.float32):
+        """
+        Cuts continuous (frames, channels) chunks of any size into epochs of duration seconds, gathered in
+        (channels, block_epochs, samples) blocks. A single preallocated block is reused, so memory does not depend
+        on the recording length; every yielded block is only valid until the next one is requested
+
+        :param fs: float
+        :param duration: float, epoch duration in seconds, e.g. DockContainer.stimuli_duration
+        :param channels: int
+        :param block_epochs: int, epochs per yielded block
+        :param dtype: np.dtype
+        """
+        self.epoch_size = int(round(duration * fs))
+        self.block = np.empty((channels, block_epochs, self.epoch_size), dtype=dtype)
+        self.epoch = 0  # Epoch of the block being filled
+        self.sample = 0  # Samples already in that epoch
+        self.epochs = 0  # Total complete epochs
+
+    def push(self, chunk: np.ndarray):
+        """
+        Generator consuming a (frames, channels) chunk and yielding every block it completes
+        :param chunk: np.ndarray
+        :return: generator of np.ndarray
+        """
+        n_epochs = self.block.shape[1]
+        position = 0
+        while position < len(chunk):
+            if self.sample == 0:
+                # Whole epochs are copied together
+                whole = min((len(chunk) - position) // self.epoch_size, n_epochs - self.epoch)
+                if whole:
+                    end = position + whole * self.epoch_size
+                    epochs = chunk[position:end].reshape(whole, self.epoch_size, -1)
+                    self.block[:, self.epoch:self.epoch + whole] = epochs.transpose(2, 0, 1)
+                    self.epoch += whole
+                    self.epochs += whole
+                    position = end
+                    if self.epoch == n_epochs:
+                        self.epoch = 0
+                        yield self.block
+                    continue
+
+            take = min(self.epoch_size - self.sample, len(chunk) - position)
+            self.block[:, self.epoch, self.sample:self.sample + take] = chunk[position:position + take].T
+            self.sample += take
+            position += take
+
+            if self.sample == self.epoch_size:
+                self.sample = 0
+                self.epoch += 1
+                self.epochs += 1
+                if self.epoch == n_epochs:
+                    self.epoch = 0
+                    yield self.block
+
+    def flush(self) -> np.ndarray:
+        """
+        Returns the complete epochs of the unfinished block and discards the incomplete epoch
+        :return: np.ndarray
+        """
+        block = self.block[:, :self.epoch]
+        self.epoch = 0
+        self.sample = 0
+
+        return block
+
+    def epochs_of(self, chunks):
+        """
+        Generator yielding the blocks of every chunk of an iterable, followed by the last partial block
+        :param chunks: iterable of (frames, channels) np.ndarray
+        :return: generator of np.ndarray
+        """
+        for chunk in chunks:
+            yield from self.push(chunk)
+
+        last = self.flush()
+        if last.shape[1]:
+            yield last
+
+
+def iter_chunks(recording: np.ndarray, chunk_frames: int = CHUNK_FRAMES):
+    """
+    Generator yielding consecutive (frames, channels) views of an array or np.memmap
+    :param recording: np.ndarray
+    :param chunk_frames: int
+    :return: generator of np.ndarray
+    """
+    for start in range(0, len(recording), chunk_frames):
+        yield recording[start:start + chunk_frames]
+
+
+def epoch_recording(source, fs: float, duration: float, block_epochs: int = 10, chunk_frames: int = CHUNK_FRAMES):
+    """
+    Generator yielding the (channels, epochs, samples) blocks of a recording, source can be a
+    (frames, channels) array or np.memmap (e.g. StimulusIO.read_wav / read_raw) or an iterable of chunks
+    :param source: np.ndarray or iterable of np.ndarray
+    :param fs: float
+    :param duration: float
+    :param block_epochs: int
+    :param chunk_frames: int
+    :return: generator of np.ndarray
+    """
+    if isinstance(source, np.ndarray):
+        chunks = iter_chunks(source.reshape(len(source), -1), chunk_frames)
+        channels = source.reshape(len(source), -1).shape[1]
+        dtype = source.dtype
+    else:
+        chunks = iter(source)
+        first = next(chunks, None)
+        if first is None:
+            return
+        first = first.reshape(len(first), -1)
+        channels = first.shape[1]
+        dtype = first.dtype
+        chunks = _prepend(first, chunks)
+
+    yield from Epocher(fs, duration, channels, block_epochs, dtype).epochs_of(chunks)
+
+
+def _prepend(first: np.ndarray, chunks):
+
+    yield first
+    yield from chunks
@@ -0,0 +1,121 @@
+import numpy as np
+from PyWave import COMPONENT_DTYPE, COMPONENT_FIELDS
+
+N_EARS = 2
+N_COMPONENTS = 4
+N_FIELDS = len(COMPONENT_FIELDS)
+
+# Values used for the fields that were never set, the carrier frequency has none: the component is left out
+FIELD_DEFAULTS = (np.nan, 0., 0., 0., 0., 1.)
+
+
+class StimulusParameters:
+
+    def __init__(self):
+        """
+        Parameters of the settings grid, 2 ears x 4 components x 6 fields stored in a COMPONENT_DTYPE structured
+        array with the values as shown on the grid (AM/FM depths in percentage, FM phase in degrees), nan if unset.
+        Every change marks its cell dirty and increases the component and ear version counters, so the caches
+        downstream can tell exactly what has to be recomputed
+        """
+        self.values = np.full((N_EARS, N_COMPONENTS), np.nan, dtype=COMPONENT_DTYPE)
+        self.enabled = np.ones(N_EARS, dtype=bool)
+        self.dirty = np.zeros((N_EARS, N_COMPONENTS, N_FIELDS), dtype=bool)
+        self.version = np.zeros((N_EARS, N_COMPONENTS), dtype=np.uint64)  # Component versions
+        self.ear_version = np.zeros(N_EARS, dtype=np.uint64)
+
+    def get(self, ear: int, component: int, field: int) -> float:
+        """
+        Returns a cell value, nan if it was never set
+        :param ear: int
+        :param component: int
+        :param field: int, index in COMPONENT_FIELDS
+        :return: float
+        """
+        return float(self.values[ear, component][COMPONENT_FIELDS[field]])
+
+    def set(self, ear: int, component: int, field: int, value: float) -> bool:
+        """
+        Sets a cell value, returning whether it changed
+        :param ear: int
+        :param component: int
+        :param field: int, index in COMPONENT_FIELDS
+        :param value: float
+        :return: bool
+        """
+        name = COMPONENT_FIELDS[field]
+        if self.values[ear, component][name] == value:
+            return False
+
+        self.values[ear, component][name] = value
+        self.dirty[ear, component, field] = True
+        self.version[ear, component] += 1
+        self.ear_version[ear] += 1
+        return True
+
+    def set_enabled(self, ear: int, enabled: bool) -> None:
+        """
+        Enables or disables every component of an ear
+        :param ear: int
+        :param enabled: bool
+        :return: None
+        """
+        if self.enabled[ear] != enabled:
+            self.enabled[ear] = enabled
+            self.ear_version[ear] += 1
+
+    def dirty_components(self, ear: int) -> np.ndarray:
+        """
+        Returns the indices of the ear components with at least one dirty field
+        :param ear: int
+        :return: np.ndarray
+        """
+        return np.flatnonzero(self.dirty[ear].any(axis=-1))
+
+    def clear(self, ear: int = None, component: int = None) -> None:
+        """
+        Clears the dirty flags of a component, of an ear or of every cell
+        :param ear: int
+        :param component: int
+        :return: None
+        """
+        if ear is None:
+            self.dirty.fill(False)
+        elif component is None:
+            self.dirty[ear] = False
+        else:
+            self.dirty[ear, component] = False
+
+    def component_table(self, ear: int) -> np.ndarray:
+        """
+        Returns the (N, 6) synthesis table of the ear components with a carrier frequency, see PyWave.synthesize.
+        Unset fields take FIELD_DEFAULTS, depths are converted to fractions and the FM phase to radians
+        :param ear: int
+        :return: np.ndarray
+        """
+        table = np.stack([self.values[ear][field] for field in COMPONENT_FIELDS], axis=-1)
+        table = np.where(np.isnan(table), FIELD_DEFAULTS, table)
+        table[:, 2:4] /= 100
+        table[:, 4] = np.radians(table[:, 4])
+
+        return table[self.component_indices(ear)]
+
+    def component_indices(self, ear: int) -> np.ndarray:
+        """
+        Returns the component index of every row of component_table, the components with a carrier frequency,
+        none when the ear is disabled
+        :param ear: int
+        :return: np.ndarray
+        """
+        if not self.enabled[ear]:
+            return np.empty(0, dtype=np.intp)
+
+        return np.flatnonzero(~np.isnan(self.values[ear][COMPONENT_FIELDS[0]]))
+
+    def channel_tables(self) -> list:
+        """
+        Returns the synthesis table of every ear in channel order, empty for the disabled ears, see
+        PyWave.synthesize_channels
+        :return: list of np.ndarray
+        """
+        return [self.component_table(ear) for ear in range(N_EARS)]
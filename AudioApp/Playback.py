@@ -0,0 +1,345 @@
+from threading import Thread, Event
+import time
+import numpy as np
+import StimulusIO
+
+try:
+    import sounddevice
+except ImportError:
+    sounddevice = None
+
+
+class RingBuffer:
+
+    def __init__(self, frames: int, channels: int, dtype: str = "float32"):
+        """
+        Preallocated single producer / single consumer ring of (frames, channels) samples.
+        The indexes only grow, each side only writes its own one
+
+        :param frames: int
+        :param channels: int
+        :param dtype: str, sample type, blocks of the same type are copied without conversion, float blocks are
+            converted with StimulusIO.to_samples otherwise
+        """
+        self.data = np.zeros((frames, channels), dtype=dtype)
+        self.capacity = frames
+        self.write_index = 0  # Total frames written
+        self.read_index = 0  # Total frames read
+
+    def available(self) -> int:
+
+        return self.write_index - self.read_index
+
+    def space(self) -> int:
+
+        return self.capacity - self.available()
+
+    def write(self, block: np.ndarray) -> int:
+        """
+        Copies as many frames of block as fit, returning how many were written
+        :param block: np.ndarray
+        :return: int
+        """
+        n = min(len(block), self.space())
+        start = self.write_index % self.capacity
+        first = min(n, self.capacity - start)
+
+        if block.dtype == self.data.dtype:
+            self.data[start:start + first] = block[:first]
+            self.data[:n - first] = block[first:n]
+        else:  # Scaled and clipped into integer rings instead of truncated
+            if block.dtype.kind != "f":
+                raise TypeError("cannot write {} blocks into a {} ring".format(block.dtype, self.data.dtype))
+            StimulusIO.to_samples(block[:first], self.data.dtype, self.data[start:start + first])
+            StimulusIO.to_samples(block[first:n], self.data.dtype, self.data[:n - first])
+        self.write_index += n  # Published after the copy
+
+        return n
+
+    def read(self, out: np.ndarray) -> int:
+        """
+        Copies as many frames as available into out, returning how many were read
+        :param out: np.ndarray
+        :return: int
+        """
+        n = min(len(out), self.available())
+        start = self.read_index % self.capacity
+        first = min(n, self.capacity - start)
+
+        out[:first] = self.data[start:start + first]
+        out[first:n] = self.data[:n - first]
+        self.read_index += n
+
+        return n
+
+
+class NullSink:
+
+    def __init__(self, fs: float, block_size: int, channels: int = 2, realtime: bool = True,
+                 dtype: str = "float32"):
+        """
+        Headless sink that pulls blocks from the engine callback in its own thread, at the audio rate when
+        realtime is True or as fast as possible otherwise
+
+        :param fs: float
+        :param block_size: int
+        :param channels: int
+        :param realtime: bool
+        :param dtype: str, sample type of the blocks, one of StimulusIO.SAMPLE_TYPES
+        """
+        self.fs = fs
+        self.block_size = block_size
+        self.channels = channels
+        self.realtime = realtime
+        self.dtype = np.dtype(dtype)
+        self.blocking = not realtime  # Waits for the producer instead of playing silence on underruns
+        self.latency = 0.  # Output latency of the device in seconds
+        self.buffer = np.zeros((block_size, channels), dtype=self.dtype)
+        self.thread = None
+        self.stopped = Event()
+
+    def start(self, callback) -> None:
+        """
+        Starts calling callback(out) until it returns False or stop() is called
+        :param callback: callable
+        :return: None
+        """
+        self.stopped.clear()
+        self.thread = Thread(target=self.run, args=(callback,), daemon=True)
+        self.thread.start()
+
+    def run(self, callback) -> None:
+
+        deadline = time.perf_counter()
+        period = self.block_size / self.fs
+        while not self.stopped.is_set():
+            if self.realtime:
+                deadline += period
+                time.sleep(max(deadline - time.perf_counter(), 0))
+            if not callback(self.buffer):
+                break
+            self.consume(self.buffer)
+        self.close()
+
+    def consume(self, block: np.ndarray) -> None:
+        """
+        Receives every block produced by the callback
+        :param block: np.ndarray
+        :return: None
+        """
+        pass
+
+    def close(self) -> None:
+
+        pass
+
+    def stop(self) -> None:
+
+        self.stopped.set()
+
+    def wait(self) -> None:
+
+        if self.thread is not None:
+            self.thread.join()
+
+
+class FileSink(NullSink):
+
+    def __init__(self, path: str, fs: float, block_size: int, channels: int = 2, realtime: bool = False,
+                 dtype: str = "float32"):
+        """
+        Sink that writes everything the engine plays into a WAV file of the blocks sample type
+
+        :param path: str
+        :param fs: float
+        :param block_size: int
+        :param channels: int
+        :param realtime: bool
+        :param dtype: str, one of StimulusIO.SAMPLE_TYPES
+        """
+        super(FileSink, self).__init__(fs, block_size, channels, realtime, dtype)
+
+        self.writer = StimulusIO.WavWriter(path, channels, fs, self.dtype.name)
+
+    def consume(self, block: np.ndarray) -> None:
+
+        self.writer.write(block)
+
+    def close(self) -> None:
+
+        self.writer.close()
+
+
+class DeviceSink:
+
+    def __init__(self, fs: float, block_size: int, channels: int = 2, device=None, dtype: str = "float32"):
+        """
+        Sound card sink, needs the optional sounddevice package
+
+        :param fs: float
+        :param block_size: int
+        :param channels: int
+        :param device: sounddevice device id or name
+        :param dtype: str, "float32" or "int16", the sample types of the sound card streams
+        """
+        if sounddevice is None:
+            raise ImportError("DeviceSink needs the sounddevice package")
+        if np.dtype(dtype) not in (np.float32, np.int16):
+            raise ValueError("sound card streams support float32 and int16 samples, not {}".format(dtype))
+
+        self.fs = fs
+        self.block_size = block_size
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.device = device
+        self.latency = 0.
+        self.blocking = False
+        self.stream = None
+        self.finished = Event()
+
+    def start(self, callback) -> None:
+
+        def device_callback(outdata, frames, time_info, status):
+            if not callback(outdata):
+                raise sounddevice.CallbackStop
+
+        self.finished.clear()
+        self.stream = sounddevice.OutputStream(samplerate=self.fs, blocksize=self.block_size,
+                                               channels=self.channels, dtype=self.dtype.name, device=self.device,
+                                               latency="low", callback=device_callback,
+                                               finished_callback=self.finished.set)
+        self.stream.start()
+        self.latency = self.stream.latency
+
+    def stop(self) -> None:
+
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.finished.set()
+
+    def wait(self) -> None:
+
+        self.finished.wait()
+
+
+class PlaybackEngine:
+
+    def __init__(self, source, sink, block_size: int, channels: int = 2, buffer_blocks: int = 4):
+        """
+        Feeds the blocks of a synthesis source to a callback driven sink. A producer thread keeps a
+        preallocated ring of buffer_blocks blocks filled, the sink callback only copies from it. The ring holds
+        samples of the sink dtype, blocks already of that type are never converted
+
+        :param source: iterable of (block_size, channels) np.ndarray, e.g. PyWave.stream_channels
+        :param sink: NullSink, FileSink or DeviceSink
+        :param block_size: int
+        :param channels: int
+        :param buffer_blocks: int, at least 2
+        """
+        self.source = source
+        self.sink = sink
+        self.block_size = block_size
+        self.ring = RingBuffer(max(buffer_blocks, 2) * block_size, channels, sink.dtype)
+
+        self.space = Event()  # Set by the callback whenever it frees room in the ring
+        self.filled = Event()  # Set by the producer whenever it adds frames to the ring
+        self.stopped = Event()  # Set by stop(), ends the producer even when the source is endless
+        self.finished = False  # The source is exhausted
+        self.producer = None
+
+        # Counters
+        self.underruns = 0
+        self.callbacks = 0
+        self.frames_played = 0
+        self.callback_time = 0.  # Longest callback duration in seconds
+        self.latencies = np.zeros(1024)  # Ring of the last measured output latencies in seconds
+
+    def start(self) -> None:
+        """
+        Prefills the ring and starts the producer and the sink
+        :return: None
+        """
+        self.stopped.clear()
+        self.producer = Thread(target=self.produce, daemon=True)
+        self.producer.start()
+        while self.ring.space() >= self.block_size and not self.finished:
+            time.sleep(0.001)
+        self.sink.start(self.callback)
+
+    def produce(self) -> None:
+        """
+        Producer thread, copies the source blocks into the ring until the source is exhausted or stop() is called
+        :return: None
+        """
+        for block in self.source:
+            written = 0
+            while written < len(block) and not self.stopped.is_set():
+                written += self.ring.write(block[written:])
+                self.filled.set()
+                if written < len(block):
+                    self.space.wait(0.1)
+                    self.space.clear()
+            if self.stopped.is_set():
+                break
+        self.finished = True
+        self.filled.set()
+
+    def callback(self, out: np.ndarray) -> bool:
+        """
+        Sink callback, copies the next frames into out and pads with silence on underruns,
+        blocking sinks wait for the producer instead. Returns False once the source is exhausted and every frame was played
+        :param out: np.ndarray
+        :return: bool
+        """
+        while self.sink.blocking and self.ring.available() < len(out) and not self.finished:
+            self.filled.wait(0.1)
+            self.filled.clear()
+
+        start = time.perf_counter()
+
+        n = self.ring.read(out)
+        buffered = self.ring.available()
+        if n < len(out):
+            out[n:] = 0
+            if not self.finished:
+                self.underruns += 1
+        self.space.set()
+
+        # Output latency: a frame the producer writes now plays after everything left in the ring, plus the device
+        self.latencies[self.callbacks % len(self.latencies)] = buffered / self.sink.fs + self.sink.latency
+        self.callbacks += 1
+        self.frames_played += n
+        self.callback_time = max(self.callback_time, time.perf_counter() - start)
+
+        return not (self.finished and n == 0)
+
+    def stop(self) -> None:
+        """
+        Stops the sink and the producer thread, blocks until the producer returned
+        :return: None
+        """
+        self.stopped.set()
+        self.space.set()
+        self.sink.stop()
+        if self.producer is not None and self.producer.is_alive():
+            self.producer.join()
+        self.producer = None
+
+    def wait(self) -> None:
+        """
+        Blocks until the sink played the whole source
+        :return: None
+        """
+        self.sink.wait()
+
+    def stats(self) -> dict:
+        """
+        Returns the playback counters, latencies in seconds
+        :return: dict
+        """
+        latencies = self.latencies[:min(self.callbacks, len(self.latencies))]
+        return {"underruns": self.underruns, "callbacks": self.callbacks, "frames_played": self.frames_played,
+                "max_callback_time": self.callback_time,
+                "mean_latency": float(latencies.mean()) if len(latencies) else 0.,
+                "max_latency": float(latencies.max()) if len(latencies) else 0.}
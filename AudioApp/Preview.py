@@ -0,0 +1,129 @@
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from StimulusCache import StimulusCache, component_key
+import Calc
+
+PREVIEW_FS = 44100  # Sampling frequency of the preview synthesis
+PREVIEW_SIZE = 4096  # Number of samples of the preview synthesis
+DEBOUNCE_MS = 150  # Parameter edits closer than this are coalesced into one computation
+LEFT, RIGHT = 0, 1
+
+
+class PreviewPipeline(QObject):
+
+    # ear, wave, frequency axis, magnitude
+    finished = pyqtSignal(int, object, object, object)
+    # ear, error message
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, fs: float = PREVIEW_FS, buffer_size: int = PREVIEW_SIZE, debounce: int = DEBOUNCE_MS,
+                 cache: StimulusCache = None, parent=None):
+        """
+        Computes the ear previews in a worker thread. Every request restarts its ear's debounce timer, only the
+        last parameters of a burst of edits are computed and results of superseded requests are dropped
+
+        :param fs: float
+        :param buffer_size: int
+        :param debounce: int, milliseconds
+        :param cache: StimulusCache, shared cache of the synthesized previews
+        :param parent: QObject
+        """
+        super(PreviewPipeline, self).__init__(parent)
+
+        self.fs = fs
+        self.buffer_size = buffer_size
+        self.cache = cache if cache is not None else StimulusCache()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+        self.pending = [None, None]  # Last requested component table and component cache keys of each ear
+        self.keys = [{}, {}]  # Cache key of every component of each ear, by component index
+        self.versions = [None, None]  # Parameters version of the last request of each ear
+        self.generation = [0, 0]  # Increased on every submitted job, older results are stale
+        self.futures = [None, None]
+        self.timers = []
+        for ear in (LEFT, RIGHT):
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setInterval(debounce)
+            timer.timeout.connect(lambda ear=ear: self.submit(ear))
+            self.timers.append(timer)
+
+    def request(self, ear: int, components: np.ndarray, version: int = None, indices=None, dirty=()) -> None:
+        """
+        Schedules the preview of one ear, components is an (N, 6) component table, see PyWave.synthesize.
+        A request with the same parameters version as the previous one is ignored. With the component indices of
+        the table rows, only the cache keys of the dirty components are computed again, the other components are
+        served from the cache
+        :param ear: int
+        :param components: np.ndarray
+        :param version: int, see Parameters.StimulusParameters.ear_version
+        :param indices: sequence of int, see Parameters.StimulusParameters.component_indices
+        :param dirty: sequence of int, see Parameters.StimulusParameters.dirty_components
+        :return: None
+        """
+        if version is not None and version == self.versions[ear]:
+            return
+
+        keys = None
+        if indices is not None:
+            known = self.keys[ear]
+            for component in dirty:
+                known.pop(component, None)
+            keys = []
+            for index, row in zip(indices, components):
+                if index not in known:
+                    known[index] = component_key(row, self.fs, self.buffer_size)
+                keys.append(known[index])
+
+        self.versions[ear] = version
+        self.pending[ear] = (components, keys)
+        self.timers[ear].start()  # (Re)starts the debounce window
+
+    def submit(self, ear: int) -> None:
+        """
+        Cancels the ear's job that has not started yet and submits the pending parameters
+        :param ear: int
+        :return: None
+        """
+        if self.futures[ear] is not None:
+            self.futures[ear].cancel()
+
+        self.generation[ear] += 1
+        self.futures[ear] = self.executor.submit(self.compute, ear, self.generation[ear], *self.pending[ear])
+
+    def compute(self, ear: int, generation: int, components: np.ndarray, keys=None) -> None:
+        """
+        Runs in the worker thread, synthesizes the ear and publishes its spectrum, or the error that prevented it,
+        unless it is already stale
+        :param ear: int
+        :param generation: int
+        :param components: np.ndarray
+        :param keys: list of str, cache key of every component
+        :return: None
+        """
+        if generation != self.generation[ear]:
+            return
+
+        try:
+            if len(components):
+                wave = self.cache.get_components(components, self.fs, self.buffer_size, keys)
+            else:
+                wave = np.zeros((self.buffer_size, 1), dtype=np.float32)
+            frq, yf, magnitude = Calc.calc_rfft(wave, self.buffer_size, self.fs)
+        except Exception as error:  # The worker has no caller, hand the error over to the GUI thread
+            if generation == self.generation[ear]:
+                self.failed.emit(ear, "{}: {}".format(type(error).__name__, error))
+            return
+
+        if generation == self.generation[ear]:
+            self.finished.emit(ear, wave[:, 0], frq, magnitude)  # Queued to the GUI thread
+
+    def shutdown(self) -> None:
+        """
+        Stops the timers and the worker thread
+        :return: None
+        """
+        for timer in self.timers:
+            timer.stop()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,443 @@
+#ifndef AFM_KERNELS_H
+#define AFM_KERNELS_H
+
+/// Synthesis kernels of PyAFM, plain C++ without any Python dependency.
+/// Invalid parameters throw std::invalid_argument, the bindings turn it into ValueError
+
+#include <math.h>
+#include <stdint.h>
+#include <stddef.h>
+#include <vector>
+#include <memory>
+#include <algorithm>
+#include <stdexcept>
+
+
+/// Oscillator engine
+/// EXACT calls sin() on the sample index argument, every other backend runs from 64 bit fixed point phase
+/// accumulators (2^64 == one cycle), which wrap for free and never lose precision on long buffers
+enum Oscillator {EXACT, ACCUMULATOR, TABLE_LINEAR, TABLE_CUBIC, ROTATOR};
+
+typedef uint64_t phase_t;
+const double PHASE_CYCLE = 18446744073709551616.0;  // 2^64
+const int ROTATOR_CHUNK = 1024;  // samples between rotator re-seeds from the exact phase
+
+inline phase_t toPhase(double cycles)
+{
+    /// Converts a phase in cycles into a fixed point phase
+    cycles -= floor(cycles);
+    return cycles < 1 ? static_cast<phase_t>(cycles * PHASE_CYCLE) : 0;
+}
+
+inline double toRadians(phase_t phase) {return phase * (2 * M_PI / PHASE_CYCLE);}
+
+class SineOscillator
+{
+public:
+    /// Evaluates sin() on fixed point phases with the selected backend
+
+    SineOscillator(Oscillator oscillator = EXACT, int table_size = 4096)
+    {
+        bits = 0;
+        while((1 << bits) < table_size && bits < 24)
+            bits++;
+        if(table_size < 4 || (1 << bits) != table_size)
+            throw std::invalid_argument("table size must be a power of two between 4 and 2^24");
+        if(oscillator < EXACT || oscillator > ROTATOR)
+            throw std::invalid_argument("unknown oscillator");
+        this->oscillator = oscillator;
+        this->table_size = table_size;
+
+        if(oscillator == TABLE_LINEAR || oscillator == TABLE_CUBIC)
+        {
+            // One guard point before and two after the cycle for the interpolation. The table is never modified
+            // once built, copies of the oscillator share it
+            std::shared_ptr<std::vector<double>> points = std::make_shared<std::vector<double>>(table_size + 3);
+            for(int k = 0; k < table_size + 3; k++)
+                (*points)[k] = sin(2 * M_PI * (k - 1) / table_size);
+            table = points;
+        }
+    }
+
+    Oscillator getOscillator() const {return oscillator;}
+    int getTableSize() const {return table_size;}
+
+    template<Oscillator O> double sine(phase_t phase) const
+    {
+        if(O == ACCUMULATOR)
+            return sin(toRadians(phase));
+
+        const double *t = table->data() + (phase >> (64 - bits)) + 1;
+        const double f = static_cast<double>((phase << bits) >> 11) * (1.0 / 9007199254740992.0);  // 2^-53
+
+        if(O == TABLE_LINEAR)
+            return t[0] + f * (t[1] - t[0]);
+
+        // Catmull-Rom cubic through the 4 closest table points
+        return t[0] + 0.5 * f * (t[1] - t[-1] + f * (2 * t[-1] - 5 * t[0] + 4 * t[1] - t[2] +
+                                                     f * (3 * (t[0] - t[1]) + t[2] - t[-1])));
+    }
+
+private:
+    Oscillator oscillator;
+    int table_size;
+    int bits;
+    std::shared_ptr<const std::vector<double>> table;
+};
+
+struct Tone
+{
+    /// One AM/FM component running from fixed point phase accumulators
+    phase_t carrier_step, am_step, fm_step;  // phase increments per sample
+    phase_t carrier_phase, am_phase, fm_phase;  // current phases
+    phase_t fm_offset;
+    double am_depth;
+    double fm_index;  // FM modulation index in radians
+    double gain;  // amplitude with the AM power normalisation applied
+
+    Tone(double carrier, double am_frequency, double fm_frequency, double am_depth, double fm_index,
+         double fm_offset, double gain, double fs)
+    {
+        carrier_step = toPhase(carrier / fs);
+        am_step = toPhase(am_frequency / fs);
+        fm_step = toPhase(fm_frequency / fs);
+        carrier_phase = am_phase = fm_phase = 0;
+        this->fm_offset = toPhase(fm_offset / (2 * M_PI));
+        this->am_depth = am_depth;
+        this->fm_index = fm_index;
+        this->gain = gain;
+    }
+
+    void advance(int n_samples)
+    {
+        carrier_phase += n_samples * carrier_step;
+        am_phase += n_samples * am_step;
+        fm_phase += n_samples * fm_step;
+    }
+};
+
+template<Oscillator O, typename T>
+void renderAccumulated(Tone &t, const SineOscillator &osc, T *wave, int n_samples, ptrdiff_t stride)
+{
+    const double fm_cycles = t.fm_index / (2 * M_PI);
+
+    for(int i = 0; i < n_samples; i++)
+    {
+        double deviation = fm_cycles * osc.sine<O>(t.fm_phase + t.fm_offset);
+        double s = osc.sine<O>(t.carrier_phase + toPhase(deviation));
+        wave[i * stride] += t.gain * (1 + t.am_depth * osc.sine<O>(t.am_phase)) * s;
+
+        t.carrier_phase += t.carrier_step;
+        t.am_phase += t.am_step;
+        t.fm_phase += t.fm_step;
+    }
+}
+
+template<typename T> void renderRotated(Tone &t, T *wave, int n_samples, ptrdiff_t stride)
+{
+    /// Complex recursive rotators, re-seeded from the phase accumulators every ROTATOR_CHUNK samples
+    const double wc = toRadians(t.carrier_step), wa = toRadians(t.am_step), wf = toRadians(t.fm_step);
+    const double cos_c = cos(wc), sin_c = sin(wc), cos_a = cos(wa), sin_a = sin(wa), cos_f = cos(wf), sin_f = sin(wf);
+
+    for(int start = 0; start < n_samples; start += ROTATOR_CHUNK)
+    {
+        int n = std::min(ROTATOR_CHUNK, n_samples - start);
+        double pc = toRadians(t.carrier_phase), pa = toRadians(t.am_phase), pf = toRadians(t.fm_phase + t.fm_offset);
+        double cc = cos(pc), sc = sin(pc), ca = cos(pa), sa = sin(pa), cf = cos(pf), sf = sin(pf), aux;
+
+        for(int i = start; i < start + n; i++)
+        {
+            double s = sc;
+            if(t.fm_index != 0)  // sin(carrier + deviation), the deviation itself still needs libm
+            {
+                double deviation = t.fm_index * sf;
+                s = sc * cos(deviation) + cc * sin(deviation);
+            }
+            wave[i * stride] += t.gain * (1 + t.am_depth * sa) * s;
+
+            aux = cc * cos_c - sc * sin_c; sc = sc * cos_c + cc * sin_c; cc = aux;
+            aux = ca * cos_a - sa * sin_a; sa = sa * cos_a + ca * sin_a; ca = aux;
+            aux = cf * cos_f - sf * sin_f; sf = sf * cos_f + cf * sin_f; cf = aux;
+        }
+        t.advance(n);
+    }
+}
+
+template<typename T>
+void renderTones(std::vector<Tone> &tones, const SineOscillator &osc, T *wave, int n_samples, ptrdiff_t stride = 1)
+{
+    /// Sums every tone into wave, one sample every stride elements, advancing their phases by n_samples
+
+    for(int i = 0; i < n_samples; i++)
+        wave[i * stride] = 0;
+
+    for(Tone &t : tones)
+    {
+        switch(osc.getOscillator())
+        {
+            case TABLE_LINEAR: renderAccumulated<TABLE_LINEAR>(t, osc, wave, n_samples, stride); break;
+            case TABLE_CUBIC: renderAccumulated<TABLE_CUBIC>(t, osc, wave, n_samples, stride); break;
+            case ROTATOR: renderRotated(t, wave, n_samples, stride); break;
+            default: renderAccumulated<ACCUMULATOR>(t, osc, wave, n_samples, stride); break;
+        }
+    }
+}
+
+
+class AFMWave
+{
+public:
+    float pi = M_PI;
+
+    AFMWave(float carrier_frequency, float amplitude, int buffer_size)
+    {
+        this->carrier_frequency = carrier_frequency;
+        this->amplitude = amplitude;
+        this->buffer_size = buffer_size;
+    }
+    /// Setter methods
+    void setCarrierFrequency(float frequency) {this->carrier_frequency = frequency;}
+    void setAmplitude(float amplitude) {this->amplitude = amplitude;}
+    void setAMFrequency(float frequency) {this->am_frequency = frequency;}
+    void setFMFrequency(float frequency) {this->fm_frequency = frequency;}
+    void setAMDepth(float depth) {this->am_depth = depth;}
+    void setFMDepth(float depth) {this->fm_depth = depth;}
+    void setFS(float fs) {this->fs = fs;}
+    void setBufferSize(int buffer_size) {this->buffer_size = buffer_size;}
+    void setOscillator(Oscillator oscillator, int table_size = 4096)
+    {
+        this->oscillator = SineOscillator(oscillator, table_size);
+    }
+    /// Getter methods
+    float getCarrierFrequency() {return this->carrier_frequency;}
+    float getAmplitude() {return this->amplitude;}
+    float getAMFrequency() {return this->am_frequency;}
+    float getFMFrequency() {return this->fm_frequency;}
+    float getAMDepth() {return this->am_depth;}
+    float getFMDepth() {return this->fm_depth;}
+    float getFS() {return this->fs;}
+    int getBufferSize() {return this->buffer_size;}
+    Oscillator getOscillator() {return this->oscillator.getOscillator();}
+    int getTableSize() {return this->oscillator.getTableSize();}
+    Tone getTone() {return Tone(carrier_frequency, am_frequency, fm_frequency, am_depth, fmIndex(), 0, amGain(), fs);}
+
+    /// Raw buffer generators, wave must hold buffer_size samples one every stride elements, e.g. one channel of an
+    /// interleaved (frames, channels) buffer. EXACT evaluates the formulas in the sample type, float or double,
+    /// every other backend in double
+    template<typename T> void fillAMWave(T *wave, ptrdiff_t stride = 1)
+    {
+        if(oscillator.getOscillator() != EXACT)
+            return renderTone(Tone(carrier_frequency, am_frequency, 0, am_depth, 0, 0, amGain(), fs), wave, stride);
+
+        const T pi = M_PI;
+        const T w_carrier = 2 * pi * carrier_frequency / fs;
+        const T w_am = 2 * pi * am_frequency / fs;
+        const T gain = amplitude / sqrt(1 + pow(am_depth, 2) / 2);  // AM power normalisation
+        const T depth = am_depth;
+
+        for(int i = 0; i < buffer_size; i++)
+            wave[i * stride] = gain * (1 + depth * sin(w_am * i)) * sin(w_carrier * i);
+    }
+
+    template<typename T> void fillFMWave(T *wave, ptrdiff_t stride = 1)
+    {
+        if(oscillator.getOscillator() != EXACT)
+            return renderTone(Tone(carrier_frequency, 0, fm_frequency, 0, fmIndex(), 0, amplitude, fs), wave, stride);
+
+        const T pi = M_PI;
+        const T w_carrier = 2 * pi * carrier_frequency / fs;
+        const T w_fm = 2 * pi * fm_frequency / fs;
+        const T index = fm_depth == 0 ? 0
+                        : (static_cast<T>(fm_depth) * carrier_frequency) / (2 * static_cast<T>(fm_frequency));
+        const T gain = amplitude;
+
+        for(int i = 0; i < buffer_size; i++)
+            wave[i * stride] = gain * sin(w_carrier * i + index * sin(w_fm * i));
+    }
+
+    template<typename T> void fillAFMWave(T *wave, ptrdiff_t stride = 1)
+    {
+        if(oscillator.getOscillator() != EXACT)
+            return renderTone(Tone(carrier_frequency, am_frequency, fm_frequency, am_depth, fmIndex(), 0, amGain(), fs),
+                              wave, stride);
+
+        const T pi = M_PI;
+        const T w_carrier = 2 * pi * carrier_frequency / fs;
+        const T w_am = 2 * pi * am_frequency / fs;
+        const T w_fm = 2 * pi * fm_frequency / fs;
+        const T index = fm_depth == 0 ? 0
+                        : (static_cast<T>(fm_depth) * carrier_frequency) / (2 * static_cast<T>(fm_frequency));
+        const T gain = amplitude / sqrt(1 + pow(am_depth, 2) / 2);
+        const T depth = am_depth;
+
+        for(int i = 0; i < buffer_size; i++)
+            wave[i * stride] = gain * (1 + depth * sin(w_am * i)) * sin(w_carrier * i + index * sin(w_fm * i));
+    }
+
+private:
+    double amGain() {return amplitude / sqrt(1 + pow(am_depth, 2) / 2);}
+    double fmIndex() {return fm_depth == 0 ? 0 : (fm_depth * carrier_frequency) / (2 * fm_frequency);}
+
+    template<typename T> void renderTone(Tone tone, T *wave, ptrdiff_t stride)
+    {
+        /// Renders a single tone from phase zero with the selected accumulator backend
+        std::vector<Tone> tones(1, tone);
+        renderTones(tones, oscillator, wave, buffer_size, stride);
+    }
+
+    float carrier_frequency;
+    float amplitude;
+    float am_frequency = 0;
+    float fm_frequency = 0;
+    float am_depth = 0;
+    float fm_depth = 0;
+    float fs;
+    int buffer_size;
+    SineOscillator oscillator;
+};
+
+/// Multi component synthesis
+/// Every row of the parameter table describes one component, using the same column order as the settings grid:
+/// carrier frequency, modulation frequency, AM depth, FM depth, FM phase (radians) and amplitude
+const int N_COMPONENT_FIELDS = 6;
+
+template<typename T> struct ComponentOf
+{
+    /// Loop invariants of one component, in the precision of the sample type T
+    double carrier;
+    double modulation;
+    T w_carrier;  // carrier angular step per sample
+    T w_modulation;  // modulation angular step per sample
+    T am_depth;
+    T fm_index;  // FM modulation index
+    T fm_phase;
+    T gain;  // amplitude with the AM power normalisation applied
+};
+
+typedef ComponentOf<float> Component;
+
+template<typename T = float>
+std::vector<ComponentOf<T>> readComponents(const double *row, size_t n_components, float fs)
+{
+    /// Converts a C-contiguous (N, 6) parameter table into the per component loop invariants
+    const T pi = M_PI;
+    const T rate = fs;
+
+    std::vector<ComponentOf<T>> components(n_components);
+    for(ComponentOf<T> &c : components)
+    {
+        T carrier = row[0], modulation = row[1], am_depth = row[2], fm_depth = row[3];
+
+        c.carrier = row[0];
+        c.modulation = row[1];
+        c.w_carrier = 2 * pi * carrier / rate;
+        c.w_modulation = 2 * pi * modulation / rate;
+        c.am_depth = am_depth;
+        c.fm_index = fm_depth == 0 ? 0 : (fm_depth * carrier) / (2 * modulation);
+        c.fm_phase = row[4];
+        c.gain = row[5] / sqrt(1 + pow(am_depth, 2) / 2);
+        row += N_COMPONENT_FIELDS;
+    }
+    return components;
+}
+
+template<typename T>
+void fillMultiTone(const std::vector<ComponentOf<T>> &components, int buffer_size, T *wave, T *matrix,
+                   ptrdiff_t stride = 1)
+{
+    /// Sums every component into wave, one sample every stride elements, also storing each component as a row of
+    /// matrix when it is not null
+
+    for(int i = 0; i < buffer_size; i++)
+    {
+        T s = 0;
+        for(size_t k = 0; k < components.size(); k++)
+        {
+            const ComponentOf<T> &c = components[k];
+            T m = c.w_modulation * i;
+            T v = c.gain * (1 + c.am_depth * sin(m)) * sin(c.w_carrier * i + c.fm_index * sin(m + c.fm_phase));
+            if(matrix)
+                matrix[k * buffer_size + i] = v;
+            s += v;
+        }
+        wave[i * stride] = s;
+    }
+}
+
+/// Streaming synthesis
+/// AFMStream yields consecutive blocks of the summed components, keeping the carrier, AM and FM phases
+/// in the tones phase accumulators so that every block continues exactly where the previous one ended
+class AFMStream
+{
+public:
+    AFMStream(const std::vector<Component> &components, float fs, int block_size, long long n_blocks = 0)
+    {
+        for(const Component &c : components)
+            tones.push_back(Tone(c.carrier, c.modulation, c.modulation, c.am_depth, c.fm_index, c.fm_phase, c.gain, fs));
+        this->block_size = block_size;
+        this->n_blocks = n_blocks;
+    }
+
+    AFMStream(AFMWave &wave, int block_size, long long n_blocks = 0)
+    {
+        tones.push_back(wave.getTone());
+        this->block_size = block_size;
+        this->n_blocks = n_blocks;
+    }
+
+    void setOscillator(Oscillator oscillator, int table_size = 4096)
+    {
+        /// EXACT has no phase state, the streams evaluate it as ACCUMULATOR
+        this->oscillator = SineOscillator(oscillator == EXACT ? ACCUMULATOR : oscillator, table_size);
+    }
+
+    Oscillator getOscillator() {return oscillator.getOscillator();}
+    int getTableSize() {return oscillator.getTableSize();}
+    int getBlockSize() {return block_size;}
+    long long getSampleIndex() {return block_index * block_size;}
+    long long getBlockIndex() {return block_index;}
+    bool finished() {return n_blocks > 0 && block_index >= n_blocks;}
+
+    void reset()
+    {
+        /// Rewinds every phase accumulator to the first sample
+        for(Tone &t : tones)
+            t.carrier_phase = t.am_phase = t.fm_phase = 0;
+        block_index = 0;
+    }
+
+    template<typename T> void fill(T *wave, ptrdiff_t stride = 1)
+    {
+        /// Renders the next block into wave, which must hold block_size samples one every stride elements
+        renderTones(tones, oscillator, wave, block_size, stride);
+        block_index++;
+    }
+
+private:
+    std::vector<Tone> tones;
+    SineOscillator oscillator = SineOscillator(ACCUMULATOR);
+    int block_size;
+    long long n_blocks;  // number of blocks before StopIteration, 0 streams forever
+    long long block_index = 0;
+};
+
+inline double getOscillatorError(Oscillator oscillator, int table_size = 4096, int n_samples = 1 << 20)
+{
+    /// Returns the largest absolute error of a unit 1 kHz tone at 44.1 kHz synthesized with the given backend,
+    /// measured against a long double reference over n_samples samples
+
+    AFMWave wave(1000, 1, n_samples);
+    wave.setFS(44100);
+    wave.setOscillator(oscillator, table_size);
+
+    std::vector<float> samples(n_samples);
+    wave.fillAMWave(samples.data());
+
+    long double w = 2 * 3.141592653589793238462643383279L * 1000 / 44100;
+    double error = 0;
+    for(int i = 0; i < n_samples; i++)
+        error = std::max(error, static_cast<double>(fabsl(samples[i] - sinl(w * i))));
+    return error;
+}
+
+#endif
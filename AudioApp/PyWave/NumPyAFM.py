@@ -0,0 +1,659 @@
+"""
+Pure NumPy implementation of the PyAFM module surface, used when the native extension is not available and as a
+vectorized reference of its formulas. The waves are computed in chunks of CHUNK samples with in place ufuncs on
+per thread work buffers, so memory does not grow with the buffer size.
+
+EXACT and the multi tone functions follow the arithmetic of PyAFM.cpp in the precision of the output array, float32
+or float64. The table and rotator oscillators are not implemented: setOscillator falls back to ACCUMULATOR, the 64 bit
+fixed point phase accumulators that they approximate, getOscillator reports the fallback and getOscillatorError
+raises for them.
+"""
+from enum import IntEnum
+import math
+import threading
+import numpy as np
+
+CHUNK = 2 ** 14  # Samples computed per vectorized step
+PHASE_CYCLE = 2 ** 64  # One cycle of the fixed point phases
+PHASE_MASK = PHASE_CYCLE - 1
+RADIANS = 2 * math.pi / PHASE_CYCLE  # Fixed point phase to radians
+N_COMPONENT_FIELDS = 6
+
+
+class Oscillator(IntEnum):
+
+    EXACT = 0
+    ACCUMULATOR = 1
+    TABLE_LINEAR = 2
+    TABLE_CUBIC = 3
+    ROTATOR = 4
+
+
+Oscillator.names = dict(Oscillator.__members__)
+Oscillator.values = {int(oscillator): oscillator for oscillator in Oscillator}
+globals().update(Oscillator.__members__)
+OSCILLATORS = (EXACT, ACCUMULATOR)  # Oscillators computed by this backend, the others fall back to ACCUMULATOR
+
+_local = threading.local()
+
+
+def _work() -> dict:
+    """
+    Returns the work buffers of the calling thread
+    :return: dict
+    """
+    work = getattr(_local, "work", None)
+    if work is None:
+        work = {"ramp": np.arange(CHUNK, dtype=np.float64), "phase_ramp": np.arange(CHUNK, dtype=np.uint64),
+                "phase": np.empty(CHUNK, dtype=np.uint64), "deviation": np.empty(CHUNK, dtype=np.uint64),
+                "a": np.empty(CHUNK, dtype=np.float64), "b": np.empty(CHUNK, dtype=np.float64)}
+        _local.work = work
+
+    return work
+
+
+def _typed_work(dtype: np.dtype) -> tuple:
+    """
+    Returns the index and three scratch work buffers of the calling thread in the sample type dtype, the precision
+    of the EXACT and multi tone arithmetic
+    :param dtype: np.dtype, float32 or float64
+    :return: tuple of np.ndarray
+    """
+    work = _work()
+    buffers = work.get(dtype.name)
+    if buffers is None:
+        buffers = work[dtype.name] = tuple(np.empty(CHUNK, dtype=dtype) for i in range(4))
+
+    return buffers
+
+
+def _chunks(n_samples: int):
+    """
+    Generator yielding (start, n) for every chunk of n_samples samples
+    :param n_samples: int
+    :return: generator of tuple
+    """
+    for start in range(0, n_samples, CHUNK):
+        yield start, min(CHUNK, n_samples - start)
+
+
+def _sample_index(index: np.ndarray, start: int, n: int) -> np.ndarray:
+    """
+    Stores the sample indexes start ... start + n - 1 into index, rounded to its dtype like the int to float
+    conversion in C++
+    :param index: np.ndarray, float32 or float64 work buffer
+    :param start: int
+    :param n: int
+    :return: np.ndarray
+    """
+    work = _work()
+    index = index[:n]
+    if index.dtype == np.float64:
+        return np.add(work["ramp"][:n], start, out=index)
+
+    np.add(work["ramp"][:n], start, out=work["a"][:n])
+    np.copyto(index, work["a"][:n], casting="unsafe")
+
+    return index
+
+
+def _sample_data(out: np.ndarray, n_samples: int) -> np.ndarray:
+    """
+    Returns a flat view of out, checking that it can hold exactly n_samples float32 or float64 samples. Besides
+    C-contiguous arrays, 1-D strided views such as a column of a (frames, channels) array are accepted
+    :param out: np.ndarray
+    :param n_samples: int
+    :return: np.ndarray
+    """
+    if not isinstance(out, np.ndarray):
+        raise TypeError("output array must be a numpy ndarray")
+    if out.dtype not in (np.float32, np.float64) or not out.dtype.isnative:
+        raise TypeError("output array must have dtype float32 or float64")
+    if not out.flags.c_contiguous and not (out.ndim == 1 and out.strides[0] > 0 and
+                                           out.strides[0] % out.itemsize == 0):
+        raise ValueError("output array must be C-contiguous or a 1-D strided view")
+    if not out.flags.writeable:
+        raise ValueError("output array must be writeable")
+    if out.size != n_samples:
+        raise ValueError("output array size must be equal to the buffer size")
+
+    return out.reshape(-1)
+
+
+def _output(out: np.ndarray, n_samples: int) -> (np.ndarray, np.ndarray):
+    """
+    Returns out, or a new uninitialized (n_samples, 1) float32 array when out is None, and its flat view
+    :param out: np.ndarray
+    :param n_samples: int
+    :return: tuple with the format (np.ndarray, np.ndarray)
+    """
+    if out is None:
+        out = np.empty((n_samples, 1), dtype=np.float32)
+
+    return out, _sample_data(out, n_samples)
+
+
+def _check_oscillator(oscillator: int, table_size: int) -> Oscillator:
+    """
+    Validates the arguments of setOscillator and returns the oscillator this backend computes for them
+    :param oscillator: int
+    :param table_size: int
+    :return: Oscillator
+    """
+    if table_size < 4 or table_size > 2 ** 24 or table_size & (table_size - 1):
+        raise ValueError("table size must be a power of two between 4 and 2^24")
+    if oscillator not in Oscillator.values:
+        raise ValueError("unknown oscillator")
+
+    return Oscillator(oscillator) if oscillator in OSCILLATORS else ACCUMULATOR
+
+
+def _to_phase(cycles: float) -> int:
+    """
+    Converts a phase in cycles into a fixed point phase
+    :param cycles: float
+    :return: int
+    """
+    cycles -= math.floor(cycles)
+    return int(cycles * PHASE_CYCLE) if cycles < 1 else 0
+
+
+class _Tone:
+
+    def __init__(self, carrier: float, am_frequency: float, fm_frequency: float, am_depth: float, fm_index: float,
+                 fm_offset: float, gain: float, fs: float):
+        """
+        One AM/FM component running from fixed point phase accumulators, see Tone in AFMKernels.h
+        """
+        carrier, am_frequency, fm_frequency, fs = float(carrier), float(am_frequency), float(fm_frequency), float(fs)
+        self.carrier_step = _to_phase(carrier / fs)
+        self.am_step = _to_phase(am_frequency / fs)
+        self.fm_step = _to_phase(fm_frequency / fs)
+        self.carrier_phase = self.am_phase = self.fm_phase = 0
+        self.fm_offset = _to_phase(float(fm_offset) / (2 * math.pi))
+        self.am_depth = float(am_depth)
+        self.fm_index = float(fm_index)
+        self.gain = float(gain)
+
+    def advance(self, n_samples: int) -> None:
+
+        self.carrier_phase = (self.carrier_phase + n_samples * self.carrier_step) & PHASE_MASK
+        self.am_phase = (self.am_phase + n_samples * self.am_step) & PHASE_MASK
+        self.fm_phase = (self.fm_phase + n_samples * self.fm_step) & PHASE_MASK
+
+    def phases(self, work: dict, step: int, phase: int, n: int, out: np.ndarray) -> np.ndarray:
+        """
+        Stores the radians of the phases phase + k * step, k < n, into out
+        """
+        phases = work["phase"][:n]
+        np.multiply(work["phase_ramp"][:n], np.uint64(step), out=phases)  # Wraps modulo 2^64 like the accumulators
+        np.add(phases, np.uint64(phase), out=phases)
+
+        return np.multiply(phases, RADIANS, out=out)
+
+    def render(self, wave: np.ndarray, add: bool) -> None:
+        """
+        Renders the next len(wave) samples into wave, or adds them to it when add is True
+        :param wave: np.ndarray, flat float32 or float64 array
+        :param add: bool
+        :return: None
+        """
+        work = _work()
+        for start, n in _chunks(len(wave)):
+            s, m = work["a"][:n], work["b"][:n]
+            carrier = work["phase"][:n]
+
+            if self.fm_index != 0:
+                # Deviation in cycles, converted into a fixed point phase added to the carrier phase
+                self.phases(work, self.fm_step, (self.fm_phase + self.fm_offset) & PHASE_MASK, n, m)
+                np.sin(m, out=m)
+                np.multiply(m, self.fm_index / (2 * math.pi), out=m)
+                np.floor(m, out=s)
+                np.subtract(m, s, out=m)
+                np.multiply(m, float(PHASE_CYCLE), out=m)
+                np.putmask(m, m >= float(PHASE_CYCLE), 0)
+                deviation = work["deviation"][:n]
+                np.copyto(deviation, m, casting="unsafe")
+
+                np.multiply(work["phase_ramp"][:n], np.uint64(self.carrier_step), out=carrier)
+                np.add(carrier, np.uint64(self.carrier_phase), out=carrier)
+                np.add(carrier, deviation, out=carrier)
+                np.multiply(carrier, RADIANS, out=s)
+            else:
+                self.phases(work, self.carrier_step, self.carrier_phase, n, s)
+            np.sin(s, out=s)
+
+            self.phases(work, self.am_step, self.am_phase, n, m)
+            np.sin(m, out=m)
+            np.multiply(m, self.am_depth, out=m)
+            np.add(m, 1, out=m)
+            np.multiply(m, self.gain, out=m)
+            np.multiply(s, m, out=s)
+
+            if add:
+                np.add(wave[start:start + n], s, out=wave[start:start + n], casting="unsafe")
+            else:
+                np.copyto(wave[start:start + n], s, casting="unsafe")
+            self.advance(n)
+
+
+def _render_tones(tones: list, wave: np.ndarray) -> None:
+    """
+    Sums every tone into wave, advancing their phases by len(wave)
+    :param tones: list of _Tone
+    :param wave: np.ndarray
+    :return: None
+    """
+    if not tones:
+        wave.fill(0)
+    for k, tone in enumerate(tones):
+        tone.render(wave, add=k > 0)
+
+
+class AFMWave:
+
+    def __init__(self, carrier_frequency: float, amplitude: float, buffer_size: int):
+        """
+        NumPy version of PyAFM.AFMWave, the parameters are stored as float32 like in the native class. The EXACT
+        formulas are evaluated in the dtype of the output array
+
+        :param carrier_frequency: float
+        :param amplitude: float
+        :param buffer_size: int
+        """
+        self.carrier_frequency = np.float32(carrier_frequency)
+        self.amplitude = np.float32(amplitude)
+        self.am_frequency = np.float32(0)
+        self.fm_frequency = np.float32(0)
+        self.am_depth = np.float32(0)
+        self.fm_depth = np.float32(0)
+        self.fs = np.float32(0)
+        self.buffer_size = int(buffer_size)
+        self.oscillator = EXACT
+        self.table_size = 4096
+
+    # Setter methods
+    def setCarrierFrequency(self, frequency: float) -> None:
+        self.carrier_frequency = np.float32(frequency)
+
+    def setAmplitude(self, amplitude: float) -> None:
+        self.amplitude = np.float32(amplitude)
+
+    def setAMFrequency(self, frequency: float) -> None:
+        self.am_frequency = np.float32(frequency)
+
+    def setFMFrequency(self, frequency: float) -> None:
+        self.fm_frequency = np.float32(frequency)
+
+    def setAMDepth(self, depth: float) -> None:
+        self.am_depth = np.float32(depth)
+
+    def setFMDepth(self, depth: float) -> None:
+        self.fm_depth = np.float32(depth)
+
+    def setFS(self, fs: float) -> None:
+        self.fs = np.float32(fs)
+
+    def setBufferSize(self, buffer_size: int) -> None:
+        self.buffer_size = int(buffer_size)
+
+    def setOscillator(self, oscillator: int, table_size: int = 4096) -> None:
+        """
+        TABLE_LINEAR, TABLE_CUBIC and ROTATOR are evaluated as ACCUMULATOR, see getOscillator
+        """
+        self.oscillator = _check_oscillator(oscillator, table_size)
+        self.table_size = table_size
+
+    # Getter methods
+    def getCarrierFrequency(self) -> float:
+        return float(self.carrier_frequency)
+
+    def getAmplitude(self) -> float:
+        return float(self.amplitude)
+
+    def getAMFrequency(self) -> float:
+        return float(self.am_frequency)
+
+    def getFMFrequency(self) -> float:
+        return float(self.fm_frequency)
+
+    def getAMDepth(self) -> float:
+        return float(self.am_depth)
+
+    def getFMDepth(self) -> float:
+        return float(self.fm_depth)
+
+    def getFS(self) -> float:
+        return float(self.fs)
+
+    def getBufferSize(self) -> int:
+        return self.buffer_size
+
+    def getOscillator(self) -> Oscillator:
+        return self.oscillator
+
+    def getTableSize(self) -> int:
+        return self.table_size
+
+    # Generators
+    def getAMWave(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Returns the AM wave as a (buffer_size, 1) float32 array, or fills a float32 or float64 out
+        :param out: np.ndarray
+        :return: np.ndarray
+        """
+        out, wave = _output(out, self.buffer_size)
+        if self.oscillator != EXACT:
+            _render_tones([_Tone(self.carrier_frequency, self.am_frequency, 0, self.am_depth, 0, 0, self._am_gain(),
+                                 self.fs)], wave)
+            return out
+
+        t = wave.dtype.type
+        w_carrier, w_am, gain = self._w(self.carrier_frequency, t), self._w(self.am_frequency, t), t(self._am_gain())
+        index, a, b, c = _typed_work(wave.dtype)
+        for start, n in _chunks(self.buffer_size):
+            i, a_n, b_n = _sample_index(index, start, n), a[:n], b[:n]
+            self._am(i, w_am, t(self.am_depth), gain, a_n)
+            np.multiply(i, w_carrier, out=b_n)
+            np.sin(b_n, out=b_n)
+            np.multiply(a_n, b_n, out=wave[start:start + n])
+
+        return out
+
+    def getFMWave(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Returns the FM wave as a (buffer_size, 1) float32 array, or fills a float32 or float64 out
+        :param out: np.ndarray
+        :return: np.ndarray
+        """
+        out, wave = _output(out, self.buffer_size)
+        if self.oscillator != EXACT:
+            _render_tones([_Tone(self.carrier_frequency, 0, self.fm_frequency, 0, self._fm_index(), 0,
+                                 self.amplitude, self.fs)], wave)
+            return out
+
+        t = wave.dtype.type
+        w_carrier, w_fm, fm_index = self._w(self.carrier_frequency, t), self._w(self.fm_frequency, t), self._index(t)
+        index, a, b, c = _typed_work(wave.dtype)
+        for start, n in _chunks(self.buffer_size):
+            i, b_n = _sample_index(index, start, n), b[:n]
+            self._fm(i, w_carrier, w_fm, fm_index, b_n, c[:n])
+            np.multiply(b_n, t(self.amplitude), out=wave[start:start + n])
+
+        return out
+
+    def getAFMWave(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Returns the AM and FM wave as a (buffer_size, 1) float32 array, or fills a float32 or float64 out
+        :param out: np.ndarray
+        :return: np.ndarray
+        """
+        out, wave = _output(out, self.buffer_size)
+        if self.oscillator != EXACT:
+            _render_tones([self._tone()], wave)
+            return out
+
+        t = wave.dtype.type
+        w_carrier, w_am, w_fm = (self._w(frequency, t) for frequency in (self.carrier_frequency, self.am_frequency,
+                                                                          self.fm_frequency))
+        fm_index, gain = self._index(t), t(self._am_gain())
+        index, a, b, c = _typed_work(wave.dtype)
+        for start, n in _chunks(self.buffer_size):
+            i, a_n, b_n = _sample_index(index, start, n), a[:n], b[:n]
+            self._am(i, w_am, t(self.am_depth), gain, a_n)
+            self._fm(i, w_carrier, w_fm, fm_index, b_n, c[:n])
+            np.multiply(a_n, b_n, out=wave[start:start + n])
+
+        return out
+
+    # Loop invariants and terms of the EXACT formulas, in the sample type t
+    def _w(self, frequency: np.float32, t: type) -> np.floating:
+        return t(2) * t(math.pi) * t(frequency) / t(self.fs)
+
+    def _index(self, t: type = np.float32) -> np.floating:
+        if self.fm_depth == 0:  # No FM, the FM frequency may be unset as well
+            return t(0)
+        return (t(self.fm_depth) * t(self.carrier_frequency)) / (t(2) * t(self.fm_frequency))  # modulation index
+
+    def _am_gain(self) -> float:
+        return float(self.amplitude) / math.sqrt(1 + float(self.am_depth) ** 2 / 2)  # AM power normalisation
+
+    def _fm_index(self) -> float:
+        if self.fm_depth == 0:
+            return 0.
+        return float(self._index())
+
+    def _tone(self) -> _Tone:
+        return _Tone(self.carrier_frequency, self.am_frequency, self.fm_frequency, self.am_depth, self._fm_index(), 0,
+                     self._am_gain(), self.fs)
+
+    @staticmethod
+    def _am(i: np.ndarray, w_am: np.floating, depth: np.floating, gain: np.floating, out: np.ndarray) -> None:
+        """
+        out = gain * (1 + am_depth * sin(w_am * i))
+        """
+        np.multiply(i, w_am, out=out)
+        np.sin(out, out=out)
+        np.multiply(out, depth, out=out)
+        np.add(out, out.dtype.type(1), out=out)
+        np.multiply(out, gain, out=out)
+
+    @staticmethod
+    def _fm(i: np.ndarray, w_carrier: np.floating, w_fm: np.floating, index: np.floating, out: np.ndarray,
+            carrier: np.ndarray) -> None:
+        """
+        out = sin(w_carrier * i + index * sin(w_fm * i)), carrier is a scratch buffer
+        """
+        np.multiply(i, w_fm, out=out)
+        np.sin(out, out=out)
+        np.multiply(out, index, out=out)
+        np.multiply(i, w_carrier, out=carrier)
+        np.add(carrier, out, out=out)
+        np.sin(out, out=out)
+
+
+class _Component:
+
+    def __init__(self, row: np.ndarray, fs: float, t: type = np.float32):
+        """
+        Loop invariants of one row of the parameter table in the sample type t, see ComponentOf in AFMKernels.h
+        """
+        rate = t(np.float32(fs))
+        carrier, modulation, am_depth, fm_depth = (t(value) for value in row[:4])
+
+        self.carrier = float(row[0])
+        self.modulation = float(row[1])
+        self.w_carrier = t(2) * t(math.pi) * carrier / rate
+        self.w_modulation = t(2) * t(math.pi) * modulation / rate
+        self.am_depth = am_depth
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.fm_index = t(0) if fm_depth == 0 else (fm_depth * carrier) / (t(2) * modulation)
+        self.fm_phase = t(row[4])
+        self.gain = t(row[5] / math.sqrt(1 + float(am_depth) ** 2 / 2))
+
+
+def _read_components(params, fs: float, dtype: np.dtype = np.dtype(np.float32)) -> list:
+    """
+    Converts an (N, 6) parameter table into the per component loop invariants in the precision of dtype
+    :param params: np.ndarray
+    :param fs: float
+    :param dtype: np.dtype, float32 or float64
+    :return: list of _Component
+    """
+    table = np.asarray(params, dtype=np.float64)
+    if table.ndim != 2 or table.shape[1] != N_COMPONENT_FIELDS:
+        raise ValueError("parameter table must have shape (N, 6)")
+
+    return [_Component(row, fs, dtype.type) for row in table]
+
+
+def _fill_multi_tone(components: list, buffer_size: int, wave: np.ndarray, matrix: np.ndarray = None) -> None:
+    """
+    Sums every component into wave, also storing each component as a row of matrix when it is not None
+    """
+    index, a, b, carrier = _typed_work(wave.dtype)
+    one = wave.dtype.type(1)
+    for start, n in _chunks(buffer_size):
+        i, m, v, c = _sample_index(index, start, n), a[:n], b[:n], carrier[:n]
+        s = wave[start:start + n]
+        s.fill(0)
+
+        for k, component in enumerate(components):
+            np.multiply(i, component.w_modulation, out=m)
+            np.add(m, component.fm_phase, out=v)
+            np.sin(v, out=v)
+            np.multiply(v, component.fm_index, out=v)
+            np.multiply(i, component.w_carrier, out=c)
+            np.add(c, v, out=v)
+            np.sin(v, out=v)
+            np.sin(m, out=m)
+            np.multiply(m, component.am_depth, out=m)
+            np.add(m, one, out=m)
+            np.multiply(m, component.gain, out=m)
+            np.multiply(m, v, out=v)
+
+            if matrix is not None:
+                matrix[k, start:start + n] = v
+            np.add(s, v, out=s)
+
+
+def getMultiToneWave(params, fs: float, buffer_size: int, out: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the (buffer_size, 1) sum of every component of the (N, 6) parameter table, or fills a float32 or float64
+    out, synthesized in the precision of its dtype
+    :param params: np.ndarray
+    :param fs: float
+    :param buffer_size: int
+    :param out: np.ndarray
+    :return: np.ndarray
+    """
+    out, wave = _output(out, buffer_size)
+    components = _read_components(params, fs, wave.dtype)
+    _fill_multi_tone(components, buffer_size, wave)
+
+    return out
+
+
+def getMultiToneComponents(params, fs: float, buffer_size: int) -> (np.ndarray, np.ndarray):
+    """
+    Returns the (buffer_size, 1) sum together with the (N, buffer_size) matrix holding each component
+    :param params: np.ndarray
+    :param fs: float
+    :param buffer_size: int
+    :return: tuple with the format (np.ndarray, np.ndarray)
+    """
+    components = _read_components(params, fs)
+    out, wave = _output(None, buffer_size)
+    matrix = np.empty((len(components), buffer_size), dtype=np.float32)
+    _fill_multi_tone(components, buffer_size, wave, matrix)
+
+    return out, matrix
+
+
+class AFMStream:
+
+    def __init__(self, *args, **kwargs):
+        """
+        NumPy version of PyAFM.AFMStream, built as AFMStream(params, fs, block_size, n_blocks=0) or
+        AFMStream(wave, block_size, n_blocks=0)
+        """
+        first = args[0] if args else kwargs.get("wave")
+        if isinstance(first, AFMWave):
+            self._from_wave(*args, **kwargs)
+        else:
+            self._from_table(*args, **kwargs)
+
+        self.oscillator = ACCUMULATOR
+        self.table_size = 4096
+        self.block_index = 0
+
+    def _from_wave(self, wave: AFMWave, block_size: int, n_blocks: int = 0) -> None:
+
+        self.tones = [wave._tone()]
+        self.block_size = int(block_size)
+        self.n_blocks = int(n_blocks)
+
+    def _from_table(self, params, fs: float, block_size: int, n_blocks: int = 0) -> None:
+
+        self.tones = [_Tone(c.carrier, c.modulation, c.modulation, c.am_depth, c.fm_index, c.fm_phase, c.gain,
+                            np.float32(fs)) for c in _read_components(params, fs)]
+        self.block_size = int(block_size)
+        self.n_blocks = int(n_blocks)
+
+    def setOscillator(self, oscillator: int, table_size: int = 4096) -> None:
+        """
+        EXACT has no phase state, the streams evaluate it as ACCUMULATOR, like TABLE_LINEAR, TABLE_CUBIC and ROTATOR
+        """
+        oscillator = _check_oscillator(oscillator, table_size)
+        self.oscillator = ACCUMULATOR if oscillator == EXACT else oscillator
+        self.table_size = table_size
+
+    def getOscillator(self) -> Oscillator:
+        return self.oscillator
+
+    def getTableSize(self) -> int:
+        return self.table_size
+
+    def getBlockSize(self) -> int:
+        return self.block_size
+
+    def getSampleIndex(self) -> int:
+        return self.block_index * self.block_size
+
+    def getBlockIndex(self) -> int:
+        return self.block_index
+
+    def reset(self) -> None:
+        """
+        Rewinds every phase accumulator to the first sample
+        """
+        for tone in self.tones:
+            tone.carrier_phase = tone.am_phase = tone.fm_phase = 0
+        self.block_index = 0
+
+    def next(self) -> np.ndarray:
+        """
+        Returns a new (block_size, 1) float32 array with the next block
+        """
+        return self.fill(np.empty((self.block_size, 1), dtype=np.float32))
+
+    def fill(self, out: np.ndarray) -> np.ndarray:
+        """
+        Stores the next block into out
+        """
+        wave = _sample_data(out, self.block_size)
+        if 0 < self.n_blocks <= self.block_index:
+            raise StopIteration
+
+        _render_tones(self.tones, wave)
+        self.block_index += 1
+        return out
+
+    __next__ = next
+
+    def __iter__(self):
+        return self
+
+
+def getOscillatorError(oscillator: int, table_size: int = 4096, n_samples: int = 2 ** 20) -> float:
+    """
+    Returns the largest absolute error of a unit 1 kHz tone at 44.1 kHz synthesized with the given backend,
+    measured against a long double reference over n_samples samples. Raises ValueError for the oscillators this
+    backend does not compute, their error is only known to the native backend
+    :param oscillator: int
+    :param table_size: int
+    :param n_samples: int
+    :return: float
+    """
+    if oscillator in Oscillator.values and oscillator not in OSCILLATORS:
+        raise ValueError("the numpy backend evaluates {} as ACCUMULATOR, its error needs the native backend"
+                         .format(Oscillator(oscillator).name))
+
+    wave = AFMWave(1000, 1, n_samples)
+    wave.setFS(44100)
+    wave.setOscillator(oscillator, table_size)
+
+    w = 2 * np.longdouble(np.pi) * 1000 / 44100
+    reference = np.sin(w * np.arange(n_samples, dtype=np.longdouble))
+
+    return float(np.abs(wave.getAMWave().reshape(-1) - reference).max())
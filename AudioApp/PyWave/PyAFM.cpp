@@ -1,153 +1,746 @@
-#include <iostream>
-#include <fstream>
-#include <math.h>
-
-#include <boost/python.hpp>
-#include <boost/python/numpy.hpp>
-#include <boost/python/def.hpp>
-#include <boost/python/module.hpp>
+/// PyAFM python module, bindings of the AFMKernels.h synthesis kernels written against the CPython and NumPy C APIs
+
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+#include <numpy/arrayobject.h>
+
+#include <climits>
+#include <new>
+#include "AFMKernels.h"
 
-using namespace boost::python;
-namespace np = boost::python::numpy;
+static PyObject *OscillatorEnum = NULL;  // PyAFM.Oscillator, an enum.IntEnum created by the module init
 
 
-class AFMWave
+static void setKernelError()
 {
-public:
-    float pi = M_PI;
+    /// Converts the C++ exception being handled into the matching Python exception
+    try
+    {
+        throw;
+    }
+    catch(const std::invalid_argument &error)
+    {
+        PyErr_SetString(PyExc_ValueError, error.what());
+    }
+    catch(const std::bad_alloc &)
+    {
+        PyErr_NoMemory();
+    }
+    catch(const std::exception &error)
+    {
+        PyErr_SetString(PyExc_RuntimeError, error.what());
+    }
+}
 
-    AFMWave(float carrier_frequency, float amplitude, int buffer_size)
+static void *sampleData(PyObject *wave, npy_intp n_samples, int *type, npy_intp *stride)
+{
+    /// Returns the raw sample buffer of wave, checking that it can hold exactly n_samples float32 or float64 samples,
+    /// and stores its numpy type number into type and the distance between its samples, in samples, into stride.
+    /// Besides C-contiguous arrays, 1-D strided views such as a column of a (frames, channels) array are accepted
+
+    if(!PyArray_Check(wave))
+    {
+        PyErr_SetString(PyExc_TypeError, "output array must be a numpy ndarray");
+        return NULL;
+    }
+    PyArrayObject *array = reinterpret_cast<PyArrayObject *>(wave);
+    if((PyArray_TYPE(array) != NPY_FLOAT32 && PyArray_TYPE(array) != NPY_FLOAT64) || !PyArray_ISNOTSWAPPED(array))
     {
-        this->carrier_frequency = carrier_frequency;
-        this->amplitude = amplitude;
-        this->buffer_size = buffer_size;
+        PyErr_SetString(PyExc_TypeError, "output array must have dtype float32 or float64");
+        return NULL;
     }
-    /// Setter methods
-    void setCarrierFrequency(float frequency) {this->carrier_frequency = frequency;}
-    void setAmplitude(float amplitude) {this->amplitude = amplitude;}
-    void setAMFrequency(float frequency) {this->am_frequency = frequency;}
-    void setFMFrequency(float frequency) {this->fm_frequency = frequency;}
-    void setAMDepth(float depth) {this->am_depth = depth;}
-    void setFMDepth(float depth) {this->fm_depth = depth;}
-    void setFS(float fs) {this->fs = fs;}
-    void setBufferSize(int buffer_size) {this->buffer_size = buffer_size;}
-    /// Getter methods
-    float getCarrierFrequency() {return this->carrier_frequency;}
-    float getAmplitude() {return this->amplitude;}
-    float getAMFrequency() {return this->am_frequency;}
-    float getFMFrequency() {return this->fm_frequency;}
-    float getAMDepth() {return this->am_depth;}
-    float getFMDepth() {return this->fm_depth;}
-    float getFS() {return this->fs;}
-    int getBufferSize() {return this->buffer_size;}
-    /// Utilities methods
-    np::ndarray getAMWave()
+    *stride = 1;
+    if(!PyArray_IS_C_CONTIGUOUS(array) && PyArray_NDIM(array) == 1 && PyArray_STRIDE(array, 0) > 0 &&
+       PyArray_STRIDE(array, 0) % PyArray_ITEMSIZE(array) == 0)
+        *stride = PyArray_STRIDE(array, 0) / PyArray_ITEMSIZE(array);
+    else if(!PyArray_IS_C_CONTIGUOUS(array))
     {
-        /// This method creates an AM wave according to the parameters
-        /// and stores it into the wave numpy ndarray
+        PyErr_SetString(PyExc_ValueError, "output array must be C-contiguous or a 1-D strided view");
+        return NULL;
+    }
+    if(!PyArray_ISWRITEABLE(array))
+    {
+        PyErr_SetString(PyExc_ValueError, "output array must be writeable");
+        return NULL;
+    }
+    if(PyArray_SIZE(array) != n_samples)
+    {
+        PyErr_SetString(PyExc_ValueError, "output array size must be equal to the buffer size");
+        return NULL;
+    }
+    *type = PyArray_TYPE(array);
+    return PyArray_DATA(array);
+}
+
+static PyObject *outputWave(PyObject *out, npy_intp n_samples, void **samples, int *type, npy_intp *stride)
+{
+    /// Returns a new reference to out, or to a new uninitialized (n_samples, 1) float32 array when out is NULL or None
 
-        boost::python::tuple shape = boost::python::make_tuple(buffer_size, 1);
-        np::dtype dtype = np::dtype::get_builtin<float>();
+    if(out == NULL || out == Py_None)
+    {
+        npy_intp shape[2] = {n_samples, 1};
+        out = PyArray_SimpleNew(2, shape, NPY_FLOAT32);
+    }
+    else
+        Py_INCREF(out);
 
-        np::ndarray wave = np::zeros(shape, dtype);
-        float s;
+    if(out != NULL && (*samples = sampleData(out, n_samples, type, stride)) == NULL)
+        Py_CLEAR(out);
+    return out;
+}
 
-        for(int i = 0; i < buffer_size; i++) // calculates the AM wave's value and stores it into wave
-        {
-            s = amplitude * (1 + am_depth * sin(2 * pi * am_frequency / fs * i));
-            float aux = 2 * pi * carrier_frequency / fs * i;
-            s = s * sin(aux);
-            aux = 1 + pow(am_depth, 2) / 2;
-            aux = sqrt(aux);
-            s /= aux;
-            wave[i] = s;
-        }
-        return wave;
+static bool parseOut(PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames, const char *name, PyObject **out)
+{
+    /// Vectorcall parsing of a single optional "out" argument
+
+    if(nargs > 1 || (kwnames != NULL && PyTuple_GET_SIZE(kwnames) + nargs > 1))
+    {
+        PyErr_Format(PyExc_TypeError, "%s() takes at most 1 argument", name);
+        return false;
+    }
+    if(kwnames != NULL && PyTuple_GET_SIZE(kwnames) == 1 &&
+       PyUnicode_CompareWithASCIIString(PyTuple_GET_ITEM(kwnames, 0), "out") != 0)
+    {
+        PyErr_Format(PyExc_TypeError, "%s() got an unexpected keyword argument '%U'", name,
+                     PyTuple_GET_ITEM(kwnames, 0));
+        return false;
     }
+    *out = nargs + (kwnames != NULL ? PyTuple_GET_SIZE(kwnames) : 0) ? args[0] : NULL;
+    return true;
+}
+
+static PyObject *oscillatorObject(Oscillator oscillator)
+{
+    return PyObject_CallFunction(OscillatorEnum, "i", static_cast<int>(oscillator));
+}
 
-    np::ndarray getFMWave()
+template<typename T> static bool readTable(PyObject *params, float fs, std::vector<ComponentOf<T>> &components)
+{
+    /// Converts an (N, 6) parameter table into the per component loop invariants in the precision of T
+
+    PyArrayObject *table = reinterpret_cast<PyArrayObject *>(
+        PyArray_FROMANY(params, NPY_DOUBLE, 0, 0, NPY_ARRAY_IN_ARRAY));  // contiguous N * 6 values, no copy if possible
+    if(table == NULL)
+        return false;
+    if(PyArray_NDIM(table) != 2 || PyArray_DIM(table, 1) != N_COMPONENT_FIELDS)
     {
-        /// This method creates an FM wave according to the parameters
-        /// and stores it into the wave numpy ndarray
+        PyErr_SetString(PyExc_ValueError, "parameter table must have shape (N, 6)");
+        Py_DECREF(table);
+        return false;
+    }
 
-        boost::python::tuple shape = boost::python::make_tuple(buffer_size, 1);
-        np::dtype dtype = np::dtype::get_builtin<float>();
+    try
+    {
+        components = readComponents<T>(reinterpret_cast<double *>(PyArray_DATA(table)), PyArray_DIM(table, 0), fs);
+    }
+    catch(...)
+    {
+        setKernelError();
+        Py_DECREF(table);
+        return false;
+    }
+    Py_DECREF(table);
+    return true;
+}
 
-        np::ndarray wave = np::zeros(shape, dtype);
-        float s;
 
-        for(int i = 0; i < buffer_size; i++) // calculates the AM wave's value and stores it into wave
-        {
-            float aux = 2 * pi * carrier_frequency / fs * i;
-            aux += (fm_depth * carrier_frequency) / (2 * fm_frequency) * sin(2 * pi * fm_frequency / fs * i);
-            s = amplitude * sin(aux);
-            wave[i] = s;
-        }
-        return wave;
+/// AFMWave
+typedef struct
+{
+    PyObject_HEAD
+    AFMWave *wave;
+} PyAFMWave;
+
+static PyObject *AFMWave_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    PyAFMWave *self = reinterpret_cast<PyAFMWave *>(type->tp_alloc(type, 0));
+    if(self == NULL)
+        return NULL;
+
+    self->wave = new(std::nothrow) AFMWave(0, 0, 0);
+    if(self->wave == NULL)
+    {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return reinterpret_cast<PyObject *>(self);
+}
+
+static int AFMWave_init(PyAFMWave *self, PyObject *args, PyObject *kwargs)
+{
+    static const char *keywords[] = {"carrier_frequency", "amplitude", "buffer_size", NULL};
+    float carrier_frequency, amplitude;
+    int buffer_size;
+
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "ffi:AFMWave", const_cast<char **>(keywords),
+                                    &carrier_frequency, &amplitude, &buffer_size))
+        return -1;
+
+    *self->wave = AFMWave(carrier_frequency, amplitude, buffer_size);
+    return 0;
+}
+
+static void AFMWave_dealloc(PyAFMWave *self)
+{
+    delete self->wave;
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject *>(self));
+}
+
+template<void (AFMWave::*Setter)(float)> static PyObject *AFMWave_setFloat(PyAFMWave *self, PyObject *value)
+{
+    double v = PyFloat_AsDouble(value);
+    if(v == -1 && PyErr_Occurred())
+        return NULL;
+
+    (self->wave->*Setter)(v);
+    Py_RETURN_NONE;
+}
+
+template<float (AFMWave::*Getter)()> static PyObject *AFMWave_getFloat(PyAFMWave *self, PyObject *)
+{
+    return PyFloat_FromDouble((self->wave->*Getter)());
+}
+
+static PyObject *AFMWave_setBufferSize(PyAFMWave *self, PyObject *value)
+{
+    long buffer_size = PyLong_AsLong(value);
+    if(buffer_size == -1 && PyErr_Occurred())
+        return NULL;
+    if(buffer_size > INT_MAX || buffer_size < INT_MIN)
+    {
+        PyErr_SetString(PyExc_OverflowError, "buffer size does not fit in an int");
+        return NULL;
     }
 
-    np::ndarray getAFMWave()
+    self->wave->setBufferSize(buffer_size);
+    Py_RETURN_NONE;
+}
+
+static PyObject *AFMWave_getBufferSize(PyAFMWave *self, PyObject *)
+{
+    return PyLong_FromLong(self->wave->getBufferSize());
+}
+
+static PyObject *AFMWave_setOscillator(PyAFMWave *self, PyObject *args, PyObject *kwargs)
+{
+    static const char *keywords[] = {"oscillator", "table_size", NULL};
+    int oscillator, table_size = 4096;
+
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "i|i:setOscillator", const_cast<char **>(keywords),
+                                    &oscillator, &table_size))
+        return NULL;
+
+    try
+    {
+        self->wave->setOscillator(static_cast<Oscillator>(oscillator), table_size);
+    }
+    catch(...)
     {
-        /// This method creates an AM combined with an FM wave according to the parameters
-        /// and stores it into the wave numpy ndarray
+        setKernelError();
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *AFMWave_getOscillator(PyAFMWave *self, PyObject *)
+{
+    return oscillatorObject(self->wave->getOscillator());
+}
 
-        boost::python::tuple shape = boost::python::make_tuple(buffer_size, 1);
-        np::dtype dtype = np::dtype::get_builtin<float>();
+static PyObject *AFMWave_getTableSize(PyAFMWave *self, PyObject *)
+{
+    return PyLong_FromLong(self->wave->getTableSize());
+}
 
-        np::ndarray wave = np::zeros(shape, dtype);
-        float s;
+static const char AM_WAVE[] = "getAMWave", FM_WAVE[] = "getFMWave", AFM_WAVE[] = "getAFMWave";
 
-        for(int i = 0; i < buffer_size; i++) // calculates the AM wave's value and stores it into wave
-        {
-            s = amplitude * (1 + am_depth * sin(2 * pi * am_frequency / fs * i));
-            float aux = 2 * pi * carrier_frequency / fs * i;
-            aux += (fm_depth * carrier_frequency) / (2 * fm_frequency) * sin(2 * pi * fm_frequency / fs * i);
-            s *= sin(aux);
-            aux = 1 + pow(am_depth, 2) / 2;
-            aux = sqrt(aux);
-            s /= aux;
-
-            wave[i] = s;
-        }
-        return wave;
+template<void (AFMWave::*FillFloat)(float *, ptrdiff_t), void (AFMWave::*FillDouble)(double *, ptrdiff_t),
+         const char *Name>
+static PyObject *AFMWave_generate(PyAFMWave *self, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames)
+{
+    /// Creates a wave according to the parameters, into out when it is given. The GIL is released during the fill,
+    /// which therefore runs on a copy of the wave that the setters of other threads cannot change
+    AFMWave wave = *self->wave;  // Parameters only, the oscillator table is shared
+    PyObject *out;
+    void *samples;
+    int type;
+    npy_intp stride;
+    bool failed = false;
+
+    if(!parseOut(args, nargs, kwnames, Name, &out))
+        return NULL;
+    if((out = outputWave(out, wave.getBufferSize(), &samples, &type, &stride)) == NULL)
+        return NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    try
+    {
+        if(type == NPY_FLOAT64)
+            (wave.*FillDouble)(static_cast<double *>(samples), stride);
+        else
+            (wave.*FillFloat)(static_cast<float *>(samples), stride);
+    }
+    catch(...)
+    {
+        failed = true;
     }
+    Py_END_ALLOW_THREADS
+
+    if(failed)
+    {
+        Py_DECREF(out);
+        return PyErr_NoMemory();
+    }
+    return out;
+}
+
+static PyMethodDef AFMWave_methods[] = {
+    {"setCarrierFrequency", (PyCFunction)AFMWave_setFloat<&AFMWave::setCarrierFrequency>, METH_O, NULL},
+    {"setAmplitude", (PyCFunction)AFMWave_setFloat<&AFMWave::setAmplitude>, METH_O, NULL},
+    {"setAMFrequency", (PyCFunction)AFMWave_setFloat<&AFMWave::setAMFrequency>, METH_O, NULL},
+    {"setFMFrequency", (PyCFunction)AFMWave_setFloat<&AFMWave::setFMFrequency>, METH_O, NULL},
+    {"setAMDepth", (PyCFunction)AFMWave_setFloat<&AFMWave::setAMDepth>, METH_O, NULL},
+    {"setFMDepth", (PyCFunction)AFMWave_setFloat<&AFMWave::setFMDepth>, METH_O, NULL},
+    {"setFS", (PyCFunction)AFMWave_setFloat<&AFMWave::setFS>, METH_O, NULL},
+    {"setBufferSize", (PyCFunction)AFMWave_setBufferSize, METH_O, NULL},
+    {"setOscillator", (PyCFunction)(void (*)(void))AFMWave_setOscillator, METH_VARARGS | METH_KEYWORDS,
+     "setOscillator($self, /, oscillator, table_size=4096)\n--\n\nSelects the sine evaluation backend"},
+    {"getCarrierFrequency", (PyCFunction)AFMWave_getFloat<&AFMWave::getCarrierFrequency>, METH_NOARGS, NULL},
+    {"getAmplitude", (PyCFunction)AFMWave_getFloat<&AFMWave::getAmplitude>, METH_NOARGS, NULL},
+    {"getAMFrequency", (PyCFunction)AFMWave_getFloat<&AFMWave::getAMFrequency>, METH_NOARGS, NULL},
+    {"getFMFrequency", (PyCFunction)AFMWave_getFloat<&AFMWave::getFMFrequency>, METH_NOARGS, NULL},
+    {"getAMDepth", (PyCFunction)AFMWave_getFloat<&AFMWave::getAMDepth>, METH_NOARGS, NULL},
+    {"getFMDepth", (PyCFunction)AFMWave_getFloat<&AFMWave::getFMDepth>, METH_NOARGS, NULL},
+    {"getFS", (PyCFunction)AFMWave_getFloat<&AFMWave::getFS>, METH_NOARGS, NULL},
+    {"getBufferSize", (PyCFunction)AFMWave_getBufferSize, METH_NOARGS, NULL},
+    {"getOscillator", (PyCFunction)AFMWave_getOscillator, METH_NOARGS, NULL},
+    {"getTableSize", (PyCFunction)AFMWave_getTableSize, METH_NOARGS, NULL},
+    {"getAMWave", (PyCFunction)(void (*)(void))
+     AFMWave_generate<&AFMWave::fillAMWave<float>, &AFMWave::fillAMWave<double>, AM_WAVE>,
+     METH_FASTCALL | METH_KEYWORDS,
+     "getAMWave($self, /, out=None)\n--\n\nReturns the AM wave as a (buffer_size, 1) float32 array, or fills a "
+     "float32 or float64 out"},
+    {"getFMWave", (PyCFunction)(void (*)(void))
+     AFMWave_generate<&AFMWave::fillFMWave<float>, &AFMWave::fillFMWave<double>, FM_WAVE>,
+     METH_FASTCALL | METH_KEYWORDS,
+     "getFMWave($self, /, out=None)\n--\n\nReturns the FM wave as a (buffer_size, 1) float32 array, or fills a "
+     "float32 or float64 out"},
+    {"getAFMWave", (PyCFunction)(void (*)(void))
+     AFMWave_generate<&AFMWave::fillAFMWave<float>, &AFMWave::fillAFMWave<double>, AFM_WAVE>,
+     METH_FASTCALL | METH_KEYWORDS,
+     "getAFMWave($self, /, out=None)\n--\n\nReturns the AM and FM wave as a (buffer_size, 1) float32 array, or fills "
+     "a float32 or float64 out"},
+    {NULL}
+};
+
+static PyTypeObject AFMWaveType = {PyVarObject_HEAD_INIT(NULL, 0)};
+
+
+/// AFMStream
+typedef struct
+{
+    PyObject_HEAD
+    AFMStream *stream;
+    bool busy;  // A block is being filled without the GIL, the stream must not change meanwhile
+} PyAFMStream;
+
+static bool checkIdle(PyAFMStream *self)
+{
+    if(self->busy)
+        PyErr_SetString(PyExc_RuntimeError, "AFMStream is filling a block in another thread");
+    return !self->busy;
+}
+
+static int AFMStream_init(PyAFMStream *self, PyObject *args, PyObject *kwargs)
+{
+    long long n_blocks = 0;
+    int block_size;
+    AFMStream *stream;
+
+    if(!checkIdle(self))
+        return -1;
+
+    PyObject *first = PyTuple_GET_SIZE(args) ? PyTuple_GET_ITEM(args, 0) :
+                      kwargs != NULL ? PyDict_GetItemString(kwargs, "wave") : NULL;
+    if(first != NULL && PyObject_TypeCheck(first, &AFMWaveType))
+    {
+        static const char *keywords[] = {"wave", "block_size", "n_blocks", NULL};
+        PyObject *wave;
+        if(!PyArg_ParseTupleAndKeywords(args, kwargs, "O!i|L:AFMStream", const_cast<char **>(keywords),
+                                        &AFMWaveType, &wave, &block_size, &n_blocks))
+            return -1;
 
-private:
-    float carrier_frequency;
-    float amplitude;
-    float am_frequency;
-    float fm_frequency;
-    float am_depth;
-    float fm_depth;
+        stream = new(std::nothrow) AFMStream(*reinterpret_cast<PyAFMWave *>(wave)->wave, block_size, n_blocks);
+    }
+    else
+    {
+        static const char *keywords[] = {"params", "fs", "block_size", "n_blocks", NULL};
+        PyObject *params;
+        float fs;
+        std::vector<Component> components;
+        if(!PyArg_ParseTupleAndKeywords(args, kwargs, "Ofi|L:AFMStream", const_cast<char **>(keywords),
+                                        &params, &fs, &block_size, &n_blocks) ||
+           !readTable(params, fs, components))
+            return -1;
+
+        stream = new(std::nothrow) AFMStream(components, fs, block_size, n_blocks);
+    }
+
+    if(stream == NULL)
+    {
+        PyErr_NoMemory();
+        return -1;
+    }
+    delete self->stream;
+    self->stream = stream;
+    return 0;
+}
+
+static void AFMStream_dealloc(PyAFMStream *self)
+{
+    delete self->stream;
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject *>(self));
+}
+
+static AFMStream *streamOf(PyAFMStream *self)
+{
+    if(self->stream == NULL)
+        PyErr_SetString(PyExc_RuntimeError, "AFMStream.__init__ was not called");
+    return self->stream;
+}
+
+static PyObject *AFMStream_setOscillator(PyAFMStream *self, PyObject *args, PyObject *kwargs)
+{
+    static const char *keywords[] = {"oscillator", "table_size", NULL};
+    int oscillator, table_size = 4096;
+    AFMStream *stream = streamOf(self);
+
+    if(stream == NULL || !PyArg_ParseTupleAndKeywords(args, kwargs, "i|i:setOscillator", const_cast<char **>(keywords),
+                                                      &oscillator, &table_size) || !checkIdle(self))
+        return NULL;
+
+    try
+    {
+        stream->setOscillator(static_cast<Oscillator>(oscillator), table_size);
+    }
+    catch(...)
+    {
+        setKernelError();
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *AFMStream_getOscillator(PyAFMStream *self, PyObject *)
+{
+    AFMStream *stream = streamOf(self);
+    return stream == NULL ? NULL : oscillatorObject(stream->getOscillator());
+}
+
+static PyObject *AFMStream_getTableSize(PyAFMStream *self, PyObject *)
+{
+    AFMStream *stream = streamOf(self);
+    return stream == NULL ? NULL : PyLong_FromLong(stream->getTableSize());
+}
+
+static PyObject *AFMStream_getBlockSize(PyAFMStream *self, PyObject *)
+{
+    AFMStream *stream = streamOf(self);
+    return stream == NULL ? NULL : PyLong_FromLong(stream->getBlockSize());
+}
+
+static PyObject *AFMStream_getSampleIndex(PyAFMStream *self, PyObject *)
+{
+    AFMStream *stream = streamOf(self);
+    return stream == NULL ? NULL : PyLong_FromLongLong(stream->getSampleIndex());
+}
+
+static PyObject *AFMStream_getBlockIndex(PyAFMStream *self, PyObject *)
+{
+    AFMStream *stream = streamOf(self);
+    return stream == NULL ? NULL : PyLong_FromLongLong(stream->getBlockIndex());
+}
+
+static PyObject *AFMStream_reset(PyAFMStream *self, PyObject *)
+{
+    AFMStream *stream = streamOf(self);
+    if(stream == NULL || !checkIdle(self))
+        return NULL;
+
+    stream->reset();
+    Py_RETURN_NONE;
+}
+
+static PyObject *fillStream(PyAFMStream *self, PyObject *out, bool raise)
+{
+    /// Stores the next block into out or into a new (block_size, 1) array, at the end of the stream raises
+    /// StopIteration when raise is true or returns NULL without an exception set otherwise.
+    /// The stream is marked busy while the GIL is released, so no other thread can change or free it
+    AFMStream *stream = streamOf(self);
+    void *samples;
+    int type;
+    npy_intp stride;
+
+    if(stream == NULL || !checkIdle(self))
+        return NULL;
+    if((out = outputWave(out, stream->getBlockSize(), &samples, &type, &stride)) == NULL)
+        return NULL;
+    if(stream->finished())
+    {
+        Py_DECREF(out);
+        if(raise)
+            PyErr_SetNone(PyExc_StopIteration);
+        return NULL;
+    }
+
+    self->busy = true;
+    Py_BEGIN_ALLOW_THREADS
+    if(type == NPY_FLOAT64)
+        stream->fill(static_cast<double *>(samples), stride);
+    else
+        stream->fill(static_cast<float *>(samples), stride);
+    Py_END_ALLOW_THREADS
+    self->busy = false;
+    return out;
+}
+
+static PyObject *AFMStream_next(PyAFMStream *self, PyObject *)
+{
+    return fillStream(self, NULL, true);
+}
+
+static PyObject *AFMStream_fill(PyAFMStream *self, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames)
+{
+    PyObject *out;
+
+    if(!parseOut(args, nargs, kwnames, "fill", &out))
+        return NULL;
+    if(out == NULL)
+    {
+        PyErr_SetString(PyExc_TypeError, "fill() missing required argument 'out'");
+        return NULL;
+    }
+    return fillStream(self, out, true);
+}
+
+static PyObject *AFMStream_iternext(PyAFMStream *self)
+{
+    return fillStream(self, NULL, false);
+}
+
+static PyMethodDef AFMStream_methods[] = {
+    {"setOscillator", (PyCFunction)(void (*)(void))AFMStream_setOscillator, METH_VARARGS | METH_KEYWORDS,
+     "setOscillator($self, /, oscillator, table_size=4096)\n--\n\nSelects the sine evaluation backend, EXACT runs as "
+     "ACCUMULATOR"},
+    {"getOscillator", (PyCFunction)AFMStream_getOscillator, METH_NOARGS, NULL},
+    {"getTableSize", (PyCFunction)AFMStream_getTableSize, METH_NOARGS, NULL},
+    {"getBlockSize", (PyCFunction)AFMStream_getBlockSize, METH_NOARGS, NULL},
+    {"getSampleIndex", (PyCFunction)AFMStream_getSampleIndex, METH_NOARGS, NULL},
+    {"getBlockIndex", (PyCFunction)AFMStream_getBlockIndex, METH_NOARGS, NULL},
+    {"reset", (PyCFunction)AFMStream_reset, METH_NOARGS, "Rewinds every phase accumulator to the first sample"},
+    {"next", (PyCFunction)AFMStream_next, METH_NOARGS,
+     "Returns a new (block_size, 1) float32 array with the next block"},
+    {"fill", (PyCFunction)(void (*)(void))AFMStream_fill, METH_FASTCALL | METH_KEYWORDS,
+     "fill($self, /, out)\n--\n\nStores the next block into out"},
+    {NULL}
+};
+
+static PyTypeObject AFMStreamType = {PyVarObject_HEAD_INIT(NULL, 0)};
+
+
+/// Module functions
+static PyObject *PyAFM_getMultiToneWave(PyObject *, PyObject *args, PyObject *kwargs)
+{
+    static const char *keywords[] = {"params", "fs", "buffer_size", "out", NULL};
+    PyObject *params, *out = NULL;
     float fs;
-    int buffer_size;
+    void *samples;
+    int buffer_size, type;
+    npy_intp stride;
+    std::vector<ComponentOf<float>> components;
+    std::vector<ComponentOf<double>> components64;  // float64 outputs are synthesized in double precision
+
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "Ofi|O:getMultiToneWave", const_cast<char **>(keywords),
+                                    &params, &fs, &buffer_size, &out) ||
+       (out = outputWave(out, buffer_size, &samples, &type, &stride)) == NULL)
+        return NULL;
+    if(!(type == NPY_FLOAT64 ? readTable(params, fs, components64) : readTable(params, fs, components)))
+    {
+        Py_DECREF(out);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    if(type == NPY_FLOAT64)
+        fillMultiTone(components64, buffer_size, static_cast<double *>(samples), static_cast<double *>(NULL), stride);
+    else
+        fillMultiTone(components, buffer_size, static_cast<float *>(samples), static_cast<float *>(NULL), stride);
+    Py_END_ALLOW_THREADS
+    return out;
+}
+
+static PyObject *PyAFM_getMultiToneComponents(PyObject *, PyObject *args, PyObject *kwargs)
+{
+    static const char *keywords[] = {"params", "fs", "buffer_size", NULL};
+    PyObject *params, *wave, *matrix;
+    float fs;
+    void *samples;
+    int buffer_size, type;
+    npy_intp stride;
+    std::vector<Component> components;
+
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "Ofi:getMultiToneComponents", const_cast<char **>(keywords),
+                                    &params, &fs, &buffer_size) ||
+       !readTable(params, fs, components) || (wave = outputWave(NULL, buffer_size, &samples, &type, &stride)) == NULL)
+        return NULL;
+
+    npy_intp shape[2] = {static_cast<npy_intp>(components.size()), buffer_size};
+    if((matrix = PyArray_SimpleNew(2, shape, NPY_FLOAT32)) == NULL)
+    {
+        Py_DECREF(wave);
+        return NULL;
+    }
+    float *rows = reinterpret_cast<float *>(PyArray_DATA(reinterpret_cast<PyArrayObject *>(matrix)));
+
+    Py_BEGIN_ALLOW_THREADS
+    fillMultiTone(components, buffer_size, static_cast<float *>(samples), rows);
+    Py_END_ALLOW_THREADS
+    return Py_BuildValue("(NN)", wave, matrix);
+}
+
+static PyObject *PyAFM_getOscillatorError(PyObject *, PyObject *args, PyObject *kwargs)
+{
+    static const char *keywords[] = {"oscillator", "table_size", "n_samples", NULL};
+    int oscillator, table_size = 4096, n_samples = 1 << 20;
+
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "i|ii:getOscillatorError", const_cast<char **>(keywords),
+                                    &oscillator, &table_size, &n_samples))
+        return NULL;
+
+    try
+    {
+        return PyFloat_FromDouble(getOscillatorError(static_cast<Oscillator>(oscillator), table_size, n_samples));
+    }
+    catch(...)
+    {
+        setKernelError();
+        return NULL;
+    }
+}
+
+static PyMethodDef PyAFM_methods[] = {
+    {"getMultiToneWave", (PyCFunction)(void (*)(void))PyAFM_getMultiToneWave, METH_VARARGS | METH_KEYWORDS,
+     "getMultiToneWave(params, fs, buffer_size, out=None)\n--\n\n"
+     "Returns the (buffer_size, 1) sum of every component of the (N, 6) parameter table, or fills a "
+     "float32 or float64 out"},
+    {"getMultiToneComponents", (PyCFunction)(void (*)(void))PyAFM_getMultiToneComponents, METH_VARARGS | METH_KEYWORDS,
+     "getMultiToneComponents(params, fs, buffer_size)\n--\n\n"
+     "Returns the (buffer_size, 1) sum together with the (N, buffer_size) matrix holding each component"},
+    {"getOscillatorError", (PyCFunction)(void (*)(void))PyAFM_getOscillatorError, METH_VARARGS | METH_KEYWORDS,
+     "getOscillatorError(oscillator, table_size=4096, n_samples=1048576)\n--\n\n"
+     "Returns the largest absolute error of a unit 1 kHz tone at 44.1 kHz synthesized with the given backend"},
+    {NULL}
+};
+
+static struct PyModuleDef PyAFM_module = {
+    PyModuleDef_HEAD_INIT, "PyAFM", "AM and FM stimulus synthesis", -1, PyAFM_methods
 };
 
-/// Python wraper
-BOOST_PYTHON_MODULE(PyAFM)
-{
-    Py_Initialize();
-    np::initialize();
-
-    class_<AFMWave>("AFMWave", init<float, float, int>())
-        .def("setCarrierFrequency", &AFMWave::setCarrierFrequency, arg("frequency"))
-        .def("setAmplitude", &AFMWave::setAmplitude, arg("amplitude"))
-        .def("setAMFrequency", &AFMWave::setAMFrequency, arg("frequency"))
-        .def("setFMFrequency", &AFMWave::setFMFrequency, arg("frequency"))
-        .def("setAMDepth", &AFMWave::setAMDepth, arg("depth"))
-        .def("setFMDepth", &AFMWave::setFMDepth, arg("depth"))
-        .def("setFS", &AFMWave::setFS, arg("fs"))
-        .def("setBufferSize", &AFMWave::setBufferSize, arg("buffer_size"))
-        .def("getCarrierFrequency", &AFMWave::getCarrierFrequency)
-        .def("getAmplitude", &AFMWave::getAmplitude)
-        .def("getAMFrequency", &AFMWave::getAMFrequency)
-        .def("getFMFrequency", &AFMWave::getFMFrequency)
-        .def("getAMDepth", &AFMWave::getAMDepth)
-        .def("getFMDepth", &AFMWave::getFMDepth)
-        .def("getFS", &AFMWave::getFS)
-        .def("getBufferSize", &AFMWave::getBufferSize)
-        .def("getAMWave", &AFMWave::getAMWave)
-        .def("getFMWave", &AFMWave::getFMWave)
-        .def("getAFMWave", &AFMWave::getAFMWave);
+static bool addOscillators(PyObject *module)
+{
+    /// Creates the Oscillator IntEnum and exports its values into the module namespace, like the former
+    /// boost::python enum it also has the names and values dictionaries
+
+    PyObject *enum_module = PyImport_ImportModule("enum");
+    if(enum_module == NULL)
+        return false;
+    OscillatorEnum = PyObject_CallMethod(enum_module, "IntEnum", "s[(si)(si)(si)(si)(si)]", "Oscillator",
+                                         "EXACT", EXACT, "ACCUMULATOR", ACCUMULATOR, "TABLE_LINEAR", TABLE_LINEAR,
+                                         "TABLE_CUBIC", TABLE_CUBIC, "ROTATOR", ROTATOR);
+    Py_DECREF(enum_module);
+    if(OscillatorEnum == NULL)
+        return false;
+
+    PyObject *names = PyDict_New(), *values = PyDict_New();
+    PyObject *members = PyObject_GetAttrString(OscillatorEnum, "__members__");
+    PyObject *module_name = PyModule_GetNameObject(module);
+    bool ok = names != NULL && values != NULL && members != NULL && module_name != NULL &&
+              PyObject_SetAttrString(OscillatorEnum, "__module__", module_name) == 0;
+    if(ok)
+    {
+        PyObject *items = PyMapping_Items(members);
+        ok = items != NULL;
+        for(Py_ssize_t i = 0; ok && i < PyList_GET_SIZE(items); i++)
+        {
+            PyObject *name = PyTuple_GET_ITEM(PyList_GET_ITEM(items, i), 0);
+            PyObject *member = PyTuple_GET_ITEM(PyList_GET_ITEM(items, i), 1);
+            PyObject *value = PyNumber_Long(member);
+            ok = value != NULL && PyDict_SetItem(names, name, member) == 0 &&
+                 PyDict_SetItem(values, value, member) == 0 && PyObject_SetAttr(module, name, member) == 0;
+            Py_XDECREF(value);
+        }
+        Py_XDECREF(items);
+    }
+    ok = ok && PyObject_SetAttrString(OscillatorEnum, "names", names) == 0 &&
+         PyObject_SetAttrString(OscillatorEnum, "values", values) == 0 &&
+         PyModule_AddObject(module, "Oscillator", OscillatorEnum) == 0;
+    if(ok)
+        Py_INCREF(OscillatorEnum);  // PyModule_AddObject stole one reference, the module global keeps another
+
+    Py_XDECREF(names);
+    Py_XDECREF(values);
+    Py_XDECREF(members);
+    Py_XDECREF(module_name);
+    return ok;
+}
+
+static bool addType(PyObject *module, PyTypeObject *type)
+{
+    if(PyType_Ready(type) < 0)
+        return false;
+    Py_INCREF(type);
+    if(PyModule_AddObject(module, strrchr(type->tp_name, '.') + 1, reinterpret_cast<PyObject *>(type)) < 0)
+    {
+        Py_DECREF(type);
+        return false;
+    }
+    return true;
+}
+
+PyMODINIT_FUNC PyInit_PyAFM(void)
+{
+    import_array();
+
+    AFMWaveType.tp_name = "PyWave.PyAFM.AFMWave";
+    AFMWaveType.tp_basicsize = sizeof(PyAFMWave);
+    AFMWaveType.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+    AFMWaveType.tp_doc = "AFMWave(carrier_frequency, amplitude, buffer_size)\n--\n\nAM / FM single tone generator";
+    AFMWaveType.tp_new = AFMWave_new;
+    AFMWaveType.tp_init = reinterpret_cast<initproc>(AFMWave_init);
+    AFMWaveType.tp_dealloc = reinterpret_cast<destructor>(AFMWave_dealloc);
+    AFMWaveType.tp_methods = AFMWave_methods;
+
+    AFMStreamType.tp_name = "PyWave.PyAFM.AFMStream";
+    AFMStreamType.tp_basicsize = sizeof(PyAFMStream);
+    AFMStreamType.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+    AFMStreamType.tp_doc = "AFMStream(params, fs, block_size, n_blocks=0)\nAFMStream(wave, block_size, n_blocks=0)\n\n"
+                           "Consecutive (block_size, 1) blocks with the phases carried across blocks, n_blocks == 0 "
+                           "streams forever";
+    AFMStreamType.tp_new = PyType_GenericNew;
+    AFMStreamType.tp_init = reinterpret_cast<initproc>(AFMStream_init);
+    AFMStreamType.tp_dealloc = reinterpret_cast<destructor>(AFMStream_dealloc);
+    AFMStreamType.tp_iter = PyObject_SelfIter;
+    AFMStreamType.tp_iternext = reinterpret_cast<iternextfunc>(AFMStream_iternext);
+    AFMStreamType.tp_methods = AFMStream_methods;
+
+    PyObject *module = PyModule_Create(&PyAFM_module);
+    if(module == NULL)
+        return NULL;
+    if(!addType(module, &AFMWaveType) || !addType(module, &AFMStreamType) || !addOscillators(module))
+    {
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
 }
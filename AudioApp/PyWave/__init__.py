@@ -1 +1,328 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+import numpy as np
+from . import NumPyAFM
 
+try:
+    from . import PyAFM
+except ImportError:  # Not built, or built for another Python
+    PyAFM = None
+
+# Available synthesis backends, the active one is picked at import time by use_backend
+BACKENDS = {name: module for name, module in (("native", PyAFM), ("numpy", NumPyAFM)) if module is not None}
+BACKEND = None  # Name of the active backend
+CALIBRATION_SIZE = 4096  # Samples synthesized to time the backends, the preview buffer size
+
+# Output sample types. float32 and float64 are synthesized directly in their precision, integer types are quantized
+# from a float32 synthesis with TPDF dither and clipping
+SAMPLE_DTYPES = ("float32", "float64", "int16")
+LAYOUTS = ("column", "flat")  # (buffer_size, 1) like the generators, or 1-D (buffer_size,)
+QUANTIZE_CHUNK = 2 ** 14  # Samples quantized per step, bounds the scratch memory of quantize
+
+# One wave component per row, in the same order as the settings grid rows
+COMPONENT_FIELDS = ("carrier_frequency", "modulation", "am_depth", "fm_depth", "fm_phase", "amplitude")
+COMPONENT_DTYPE = np.dtype([(field, np.float64) for field in COMPONENT_FIELDS])
+
+
+def fastest_backend(repeat: int = 3) -> str:
+    """
+    Times a 4 component synthesis of CALIBRATION_SIZE samples with every available backend, returning the fastest.
+    Which one wins depends on the CPU and on the libm and NumPy builds
+    :param repeat: int
+    :return: str
+    """
+    table = np.array([[500, 37, 1, 0.2, 0, 0.25], [1000, 41, 1, 0.2, 0, 0.25],
+                      [2000, 45, 1, 0.2, 0, 0.25], [4000, 49, 1, 0.2, 0, 0.25]])
+    out = np.empty(CALIBRATION_SIZE, dtype=np.float32)
+
+    times = {}
+    for name, module in BACKENDS.items():
+        module.getMultiToneWave(table, 44100, CALIBRATION_SIZE, out)  # Warm up
+        times[name] = float("inf")
+        for i in range(repeat):
+            start = time.perf_counter()
+            module.getMultiToneWave(table, 44100, CALIBRATION_SIZE, out)
+            times[name] = min(times[name], time.perf_counter() - start)
+
+    return min(times, key=times.get)
+
+
+def use_backend(name: str = None) -> str:
+    """
+    Makes AFMWave, AFMStream, Oscillator, getMultiToneWave, getMultiToneComponents and getOscillatorError of this
+    package refer to the given backend. When name is None the PYWAVE_BACKEND environment variable is used, or the
+    fastest available backend when it is not set. Returns the backend name
+    :param name: str, "native" or "numpy"
+    :return: str
+    """
+    global BACKEND, AFMWave, AFMStream, Oscillator, getMultiToneWave, getMultiToneComponents, getOscillatorError
+
+    if name is None:
+        name = os.environ.get("PYWAVE_BACKEND") or (fastest_backend() if len(BACKENDS) > 1 else next(iter(BACKENDS)))
+    if name not in BACKENDS:
+        raise ValueError("backend {} is not available, available backends: {}".format(name, ", ".join(BACKENDS)))
+
+    module = BACKENDS[name]
+    AFMWave, AFMStream, Oscillator = module.AFMWave, module.AFMStream, module.Oscillator
+    getMultiToneWave, getMultiToneComponents = module.getMultiToneWave, module.getMultiToneComponents
+    getOscillatorError = module.getOscillatorError
+    BACKEND = name
+
+    return name
+
+
+use_backend()
+
+
+def component_table(components: np.ndarray) -> np.ndarray:
+    """
+    Converts a COMPONENT_DTYPE structured array or an (N, 6) array into the (N, 6) table used by the native module
+    :param components: np.ndarray
+    :return: np.ndarray
+    """
+    if components.dtype.names is not None:
+        return np.stack([components[field] for field in COMPONENT_FIELDS], axis=-1).reshape(-1, len(COMPONENT_FIELDS))
+
+    return np.asarray(components, dtype=np.float64).reshape(-1, len(COMPONENT_FIELDS))
+
+
+def _check_sample_dtype(dtype) -> np.dtype:
+
+    if np.dtype(dtype).name not in SAMPLE_DTYPES:
+        raise ValueError("unsupported sample type {}, supported types: {}".format(dtype, ", ".join(SAMPLE_DTYPES)))
+
+    return np.dtype(dtype)
+
+
+def allocate(buffer_size: int, dtype: str = "float32", layout: str = "column") -> np.ndarray:
+    """
+    Returns a new uninitialized output buffer of buffer_size samples
+    :param buffer_size: int
+    :param dtype: str, one of SAMPLE_DTYPES
+    :param layout: str, "column" for (buffer_size, 1) or "flat" for (buffer_size,)
+    :return: np.ndarray
+    """
+    _check_sample_dtype(dtype)
+    if layout not in LAYOUTS:
+        raise ValueError("unknown layout {}, layouts: {}".format(layout, ", ".join(LAYOUTS)))
+
+    return np.empty((buffer_size, 1) if layout == "column" else buffer_size, dtype=dtype)
+
+
+def quantize(wave: np.ndarray, out: np.ndarray, dither: bool = True, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Converts float samples in [-1, 1] into the full range of the integer array out, adding triangular (TPDF) dither
+    of +-1 LSB before rounding when dither is True, and clipping. Runs in chunks of QUANTIZE_CHUNK samples
+    :param wave: np.ndarray
+    :param out: np.ndarray, C-contiguous integer array with the size of wave
+    :param dither: bool
+    :param rng: np.random.Generator, defaults to a new unseeded generator
+    :return: np.ndarray, out
+    """
+    if out.dtype.kind != "i":
+        raise TypeError("quantize needs an integer output array")
+    if out.size != wave.size or not out.flags.c_contiguous:
+        raise ValueError("output array must be C-contiguous with the size of wave")
+    if dither and rng is None:
+        rng = np.random.default_rng()
+
+    scale = np.iinfo(out.dtype).max
+    samples, quantized = wave.reshape(-1), out.reshape(-1)
+    scratch = np.empty(min(QUANTIZE_CHUNK, samples.size), dtype=np.float32 if out.itemsize <= 2 else np.float64)
+    noise = np.empty_like(scratch) if dither else None
+
+    for start in range(0, samples.size, QUANTIZE_CHUNK):
+        s = scratch[:min(QUANTIZE_CHUNK, samples.size - start)]
+        np.multiply(samples[start:start + len(s)], scale, out=s)
+        if dither:  # Difference of two uniform variables, triangular between -1 and 1 LSB
+            n = noise[:len(s)]
+            rng.random(dtype=n.dtype, out=n)
+            np.add(s, n, out=s)
+            rng.random(dtype=n.dtype, out=n)
+            np.subtract(s, n, out=s)
+        np.clip(s, -scale - 1, scale, out=s)
+        np.rint(s, out=s)
+        np.copyto(quantized[start:start + len(s)], s, casting="unsafe")
+
+    return out
+
+
+def render(generator, buffer_size: int, dtype: str = "float32", layout: str = "column", out: np.ndarray = None,
+           dither: bool = True) -> np.ndarray:
+    """
+    Runs generator(out), e.g. AFMWave.getAFMWave, into a buffer of the requested sample type and layout. float32
+    and float64 outputs are written by the generator itself, in that precision, integer outputs are quantized from
+    a float32 synthesis
+    :param generator: callable filling a float32 or float64 array of buffer_size samples
+    :param buffer_size: int
+    :param dtype: str, one of SAMPLE_DTYPES, ignored when out is given
+    :param layout: str, one of LAYOUTS, ignored when out is given
+    :param out: np.ndarray, optional C-contiguous buffer of buffer_size samples
+    :param dither: bool, TPDF dither of the integer outputs
+    :return: np.ndarray
+    """
+    if out is None:
+        out = allocate(buffer_size, dtype, layout)
+    if out.dtype.kind == "f":
+        generator(out)
+        return out
+
+    wave = np.empty(buffer_size, dtype=np.float32)
+    generator(wave)
+    return quantize(wave, out, dither)
+
+
+def synthesize(components: np.ndarray, fs: float, buffer_size: int, return_components: bool = False,
+               dtype: str = "float32", layout: str = "column", out: np.ndarray = None, dither: bool = True):
+    """
+    Synthesizes the sum of every wave component in a single native call
+    :param components: np.ndarray, (N, 6) or COMPONENT_DTYPE structured array
+    :param fs: float
+    :param buffer_size: int
+    :param return_components: bool, also return the (N, buffer_size) matrix with each component, float32 only
+    :param dtype: str, one of SAMPLE_DTYPES, float64 is synthesized in double precision
+    :param layout: str, "column" for (buffer_size, 1) or "flat" for (buffer_size,)
+    :param out: np.ndarray, optional buffer of buffer_size samples, overrides dtype and layout
+    :param dither: bool, TPDF dither of the integer sample types
+    :return: np.ndarray or tuple with the format (np.ndarray, np.ndarray)
+    """
+    table = component_table(components)
+
+    if return_components:
+        if np.dtype(dtype) != np.float32 or layout != "column" or out is not None:
+            raise ValueError("return_components only supports the default float32 column output")
+        return getMultiToneComponents(table, fs, buffer_size)
+
+    return render(lambda wave: getMultiToneWave(table, fs, buffer_size, wave), buffer_size, dtype, layout, out,
+                  dither)
+
+
+def _channel_tables(tables) -> list:
+    """
+    Returns the (N, 6) table of every channel, None for the silent channels: no table or no component
+    """
+    tables = [None if table is None else component_table(table) for table in tables]
+
+    return [table if table is not None and len(table) else None for table in tables]
+
+
+def _interleaved(out: np.ndarray, frames: int, channels: int) -> np.ndarray:
+
+    if out.shape != (frames, channels) or not out.flags.c_contiguous:
+        raise ValueError("output array must be a C-contiguous ({}, {}) array".format(frames, channels))
+
+    return out
+
+
+def synthesize_channels(tables, fs: float, buffer_size: int, dtype: str = "float32", out: np.ndarray = None,
+                        dither: bool = True) -> np.ndarray:
+    """
+    Synthesizes one component table per channel, e.g. the left and right ears, straight into the columns of an
+    interleaved C-contiguous (buffer_size, channels) array, the frame layout of sound cards and WAV files. Channels
+    whose table is None or empty, like the table of a disabled ear, are never synthesized and stay silent
+    :param tables: sequence of component tables, see synthesize, or None
+    :param fs: float
+    :param buffer_size: int
+    :param dtype: str, one of SAMPLE_DTYPES, ignored when out is given
+    :param out: np.ndarray, optional C-contiguous (buffer_size, len(tables)) array
+    :param dither: bool, TPDF dither of the integer sample types
+    :return: np.ndarray
+    """
+    tables = _channel_tables(tables)
+    silent = [channel for channel, table in enumerate(tables) if table is None]
+
+    if out is None:
+        out = np.zeros((buffer_size, len(tables)), dtype=_check_sample_dtype(dtype))  # Silent channels come free
+    else:
+        out = _interleaved(out, buffer_size, len(tables))
+        out[:, silent] = 0
+
+    frames = out if out.dtype.kind == "f" else np.zeros(out.shape, dtype=np.float32)
+    for channel, table in enumerate(tables):
+        if table is not None:
+            getMultiToneWave(table, fs, buffer_size, frames[:, channel])
+
+    if frames is not out:
+        quantize(frames, out, dither)
+        out[:, silent] = 0  # Without dither noise
+
+    return out
+
+
+def stream_channels(tables, fs: float, block_size: int, n_blocks: int = 0, dtype: str = "float32",
+                    out: np.ndarray = None):
+    """
+    Generator yielding consecutive phase continuous interleaved (block_size, channels) blocks, one component table
+    per channel, every channel stream filling its column of a single reused buffer. Silent channels, see
+    synthesize_channels, have no stream. The blocks can go straight to the StimulusIO writers and the Playback engine
+    :param tables: sequence of component tables, see synthesize, or None
+    :param fs: float
+    :param block_size: int
+    :param n_blocks: int, number of blocks to yield, 0 streams forever
+    :param dtype: str, "float32" or "float64", ignored when out is given
+    :param out: np.ndarray, optional C-contiguous (block_size, len(tables)) float32 or float64 array
+    :return: generator of np.ndarray
+    """
+    tables = _channel_tables(tables)
+
+    if out is None:
+        out = np.zeros((block_size, len(tables)), dtype=dtype)
+    else:
+        out = _interleaved(out, block_size, len(tables))
+        out[:, [channel for channel, table in enumerate(tables) if table is None]] = 0
+    streams = [(out[:, channel], AFMStream(table, fs, block_size, n_blocks))
+               for channel, table in enumerate(tables) if table is not None]
+
+    block = 0
+    while n_blocks == 0 or block < n_blocks:
+        for column, blocks in streams:
+            blocks.fill(column)
+        block += 1
+        yield out
+
+
+def stream(components: np.ndarray, fs: float, block_size: int, n_blocks: int = 0, out: np.ndarray = None):
+    """
+    Generator yielding consecutive phase continuous blocks of the summed wave components
+    :param components: np.ndarray, (N, 6) or COMPONENT_DTYPE structured array
+    :param fs: float
+    :param block_size: int
+    :param n_blocks: int, number of blocks to yield, 0 streams forever
+    :param out: np.ndarray, optional float32 or float64 buffer refilled in place on every block instead of
+    allocating, float64 blocks are synthesized in double precision
+    :return: generator of np.ndarray
+    """
+    blocks = AFMStream(component_table(components), fs, block_size, n_blocks)
+
+    if out is None:
+        yield from blocks
+        return
+
+    while n_blocks == 0 or blocks.getBlockIndex() < n_blocks:
+        yield blocks.fill(out)
+
+
+def synthesize_batch(batch, fs: float, buffer_size: int, out: np.ndarray = None, workers: int = None) -> np.ndarray:
+    """
+    Synthesizes a battery of stimuli, one per component table, across a thread pool. The native generators
+    release the GIL, so every worker runs on its own core and writes its row of out in place
+    :param batch: sequence of component tables, see synthesize
+    :param fs: float
+    :param buffer_size: int
+    :param out: np.ndarray, optional C-contiguous (len(batch), buffer_size) float32 or float64 array
+    :param workers: int, defaults to the number of cores
+    :return: np.ndarray
+    """
+    if out is None:
+        out = np.empty((len(batch), buffer_size), dtype=np.float32)
+    elif out.dtype not in (np.float32, np.float64):
+        raise TypeError("output array must be float32 or float64, not {}".format(out.dtype))
+    else:
+        _interleaved(out, len(batch), buffer_size)
+    tables = [component_table(components) for components in batch]
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        list(pool.map(lambda i: getMultiToneWave(tables[i], fs, buffer_size, out[i]), range(len(tables))))
+
+    return out
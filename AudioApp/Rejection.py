@@ -0,0 +1,142 @@
+import numpy as np
+
+SCORE_DTYPE = np.dtype([("peak_to_peak", np.float64), ("rms", np.float64), ("noise", np.float64)])
+
+
+def score_epochs(epochs: np.ndarray) -> np.ndarray:
+    """
+    Scores every epoch of a (channels, epochs, samples) block at once. noise is the epoch variance around its
+    own mean, the inverse of the weight given to the epoch by noise weighted averaging
+    :param epochs: np.ndarray, e.g. an Epoching.Epocher block
+    :return: np.ndarray with SCORE_DTYPE and shape (channels, epochs)
+    """
+    scores = np.empty(epochs.shape[:-1], dtype=SCORE_DTYPE)
+    n = epochs.shape[-1]
+
+    mean = epochs.mean(axis=-1, dtype=np.float64)
+    power = np.einsum("...i,...i->...", epochs, epochs, dtype=np.float64) / n
+
+    scores["peak_to_peak"] = epochs.max(axis=-1)
+    scores["peak_to_peak"] -= epochs.min(axis=-1)
+    scores["rms"] = np.sqrt(power)
+    scores["noise"] = np.maximum(power - mean * mean, np.finfo(np.float64).tiny)
+
+    return scores
+
+
+def weighted_average(epochs: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Weighted average of a (channels, epochs, samples) block, channels whose weights are all 0 average to 0
+    :param epochs: np.ndarray
+    :param weights: np.ndarray, (channels, epochs), see EpochRejector.weights
+    :return: np.ndarray, (channels, samples)
+    """
+    total = weights.sum(axis=-1)
+    average = np.einsum("ce,ces->cs", weights, epochs, dtype=np.float64)
+    average /= np.maximum(total, np.finfo(np.float64).tiny)[:, np.newaxis]
+
+    return average
+
+
+class EpochRejector:
+
+    def __init__(self, peak_to_peak: float = None, rms: float = None, noise_factor: float = None,
+                 weighted: bool = False, per_channel: bool = False):
+        """
+        Artifact rejection before averaging. Every block of epochs is scored at once and turned into epoch
+        weights: rejected epochs weigh 0, accepted ones 1 or the inverse of their noise when weighted is True.
+        The same instance can be fed a whole recording or the blocks of a stream, noise_factor is then relative
+        to the mean noise of every epoch seen so far
+
+        :param peak_to_peak: float, optional peak to peak threshold in signal units
+        :param rms: float, optional RMS threshold in signal units
+        :param noise_factor: float, optional threshold as a multiple of the mean epoch noise of the channel
+        :param weighted: bool, noise weighted averaging of the accepted epochs
+        :param per_channel: bool, rejects an epoch only on the channels over the thresholds instead of all of them
+        """
+        self.peak_to_peak = peak_to_peak
+        self.rms = rms
+        self.noise_factor = noise_factor
+        self.weighted = weighted
+        self.per_channel = per_channel
+
+        # Counters, per channel once the first block is scored
+        self.epochs = 0
+        self.accepted = 0
+        self.noise_sum = 0.
+
+    def weights(self, epochs: np.ndarray) -> np.ndarray:
+        """
+        Scores a (channels, epochs, samples) block and returns the weight of every epoch
+        :param epochs: np.ndarray
+        :return: np.ndarray, (channels, epochs)
+        """
+        scores = score_epochs(epochs)
+        noise = scores["noise"]
+
+        self.noise_sum = self.noise_sum + noise.sum(axis=-1)
+        self.epochs += epochs.shape[1]
+
+        keep = np.ones(noise.shape, dtype=bool)
+        if self.peak_to_peak is not None:
+            keep &= scores["peak_to_peak"] <= self.peak_to_peak
+        if self.rms is not None:
+            keep &= scores["rms"] <= self.rms
+        if self.noise_factor is not None:
+            keep &= noise <= (self.noise_factor / self.epochs) * self.noise_sum[:, np.newaxis]
+        if not self.per_channel:
+            keep &= keep.all(axis=0)
+
+        self.accepted = self.accepted + keep.sum(axis=-1)
+
+        if self.weighted:
+            return np.divide(1., noise, out=np.zeros(noise.shape), where=keep)
+        return keep.astype(np.float64)
+
+    def reject(self, epochs: np.ndarray) -> np.ndarray:
+        """
+        Returns a copy of the block without the rejected epochs, always rejecting on every channel at once,
+        e.g. before Detection.detect_epochs
+        :param epochs: np.ndarray
+        :return: np.ndarray, (channels, accepted epochs, samples)
+        """
+        keep = self.weights(epochs).all(axis=0)
+
+        return epochs[:, keep]
+
+    def average(self, epochs: np.ndarray) -> np.ndarray:
+        """
+        Weighted average of the accepted epochs of a block
+        :param epochs: np.ndarray
+        :return: np.ndarray, (channels, samples)
+        """
+        return weighted_average(epochs, self.weights(epochs))
+
+    def accumulate(self, accumulator, epochs: np.ndarray) -> np.ndarray:
+        """
+        Adds the accepted epochs of a block to a Calc.EpochAccumulator with epoch_shape (channels, samples),
+        returning their weights
+        :param accumulator: Calc.EpochAccumulator
+        :param epochs: np.ndarray
+        :return: np.ndarray, (channels, epochs)
+        """
+        weights = self.weights(epochs)
+        if weights.any():
+            accumulator.add(epochs.transpose(1, 0, 2), weights.T)
+
+        return weights
+
+    def reset(self) -> None:
+
+        self.epochs = 0
+        self.accepted = 0
+        self.noise_sum = 0.
+
+    def stats(self) -> dict:
+        """
+        Returns the rejection counters, accepted and rejection_rate per channel
+        :return: dict
+        """
+        accepted = np.atleast_1d(self.accepted)
+        return {"epochs": self.epochs, "accepted": accepted,
+                "rejection_rate": 1 - accepted / max(self.epochs, 1)}
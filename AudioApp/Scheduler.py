@@ -0,0 +1,186 @@
+import numpy as np
+import PyWave
+from StimulusCache import StimulusCache, stimulus_key
+
+SESSION_CACHE_BYTES = 64 * 2 ** 20  # Default memory budget of the stimuli synthesized by a session
+ORDERS = ("sequential", "blocked", "random")
+EVENT_DTYPE = np.dtype([("onset", np.int64), ("frames", np.int64), ("stimulus", np.int32),
+                        ("repetition", np.int32), ("trigger", np.int32)])
+
+
+def compile_events(frames, repetitions: int = 1, gap_frames=0, order: str = "sequential", triggers=None,
+                   rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Compiles a protocol into its event table, one row per stimulus presentation sorted by onset. Every stimulus is
+    presented repetitions times, "blocked" shuffles the order within each repetition and "random" over the whole
+    session. The repetition of an event counts the earlier presentations of its stimulus. Onsets are in frames from
+    the session start, each presentation is followed by its gap
+    :param frames: int or sequence of int, duration of every stimulus in frames
+    :param repetitions: int
+    :param gap_frames: int or np.ndarray, gap after each presentation, one value per event when it varies
+    :param order: str, one of ORDERS
+    :param triggers: sequence of int, trigger code of every stimulus, defaults to the stimulus index + 1
+    :param rng: np.random.Generator, used by the shuffled orders
+    :return: np.ndarray with EVENT_DTYPE
+    """
+    if order not in ORDERS:
+        raise ValueError("unknown order {}, orders: {}".format(order, ", ".join(ORDERS)))
+
+    frames = np.atleast_1d(np.asarray(frames, dtype=np.int64))
+    n_stimuli = len(frames)
+    stimuli = np.tile(np.arange(n_stimuli, dtype=np.int32), (repetitions, 1))
+    if order != "sequential":
+        rng = rng if rng is not None else np.random.default_rng()
+        stimuli = rng.permuted(stimuli, axis=1) if order == "blocked" else rng.permutation(stimuli.reshape(-1))
+    stimuli = stimuli.reshape(-1)
+
+    events = np.empty(len(stimuli), dtype=EVENT_DTYPE)
+    events["stimulus"] = stimuli
+    # Occurrence rank of every event within its stimulus: every stimulus appears repetitions times, so the stable
+    # sort lists each one's presentations in playing order
+    events["repetition"][np.argsort(stimuli, kind="stable")] = np.tile(np.arange(repetitions, dtype=np.int32),
+                                                                       n_stimuli)
+    events["frames"] = frames[stimuli]
+    events["trigger"] = stimuli + 1 if triggers is None else np.asarray(triggers, dtype=np.int32)[stimuli]
+
+    step = events["frames"] + np.broadcast_to(np.asarray(gap_frames, dtype=np.int64), len(events))
+    events["onset"][:1] = 0
+    np.cumsum(step[:-1], out=events["onset"][1:])
+
+    return events
+
+
+class SessionScheduler:
+
+    def __init__(self, stimuli, fs: float, duration, repetitions: int = 1, gap: float = 0., jitter: float = 0.,
+                 order: str = "sequential", triggers=None, seed: int = None, dtype: str = "float32",
+                 cache: StimulusCache = None):
+        """
+        Timed playlist of a stimulation session. The whole protocol is compiled up front into a compact event table
+        (see compile_events), while the audio itself is synthesized just in time: blocks() renders one interleaved
+        block at a time and every stimulus is synthesized on its first onset, then served from a bounded cache. A
+        session of thousands of presentations therefore starts at once and its memory does not depend on its length
+
+        :param stimuli: sequence of stimuli, each a sequence of per channel component tables (e.g.
+            StimulusParameters.channel_tables()), None or empty for a silent channel, see PyWave.synthesize_channels
+        :param fs: float
+        :param duration: float or sequence of float, stimulus duration in seconds, e.g.
+            DockContainer.stimuli_duration
+        :param repetitions: int, presentations of every stimulus, e.g. DockContainer.n_stimuli
+        :param gap: float, inter-stimulus gap in seconds
+        :param jitter: float, random extra gap in seconds, uniform between 0 and jitter
+        :param order: str, one of ORDERS
+        :param triggers: sequence of int, trigger code of every stimulus, defaults to the stimulus index + 1
+        :param seed: int, seed of the shuffled orders and of the jitter
+        :param dtype: str, sample type of the blocks, one of PyWave.SAMPLE_DTYPES
+        :param cache: StimulusCache, defaults to a private cache of SESSION_CACHE_BYTES
+        """
+        self.stimuli = stimuli
+        self.fs = fs
+        self.channels = len(stimuli[0])
+        self.dtype = np.dtype(dtype)
+        self.cache = cache if cache is not None else StimulusCache(SESSION_CACHE_BYTES)
+        self.keys = {}  # Cache key of every stimulus requested so far
+        self.current = (None, None)  # Last requested stimulus index and waveform, spares the cache lookups
+
+        rng = np.random.default_rng(seed)
+        durations = np.broadcast_to(np.asarray(duration, dtype=np.float64), len(stimuli))
+        self.stimulus_frames = np.rint(durations * fs).astype(np.int64)
+        n_events = len(stimuli) * repetitions
+        gap_frames = np.rint((gap + rng.uniform(0, jitter, n_events) if jitter else np.full(n_events, gap)) * fs)
+        self.events = compile_events(self.stimulus_frames, repetitions, gap_frames, order, triggers, rng)
+
+        last = self.events[-1] if len(self.events) else None
+        self.frames = 0 if last is None else int(last["onset"] + last["frames"])  # Session length
+        self.frame = 0  # Frames rendered by blocks()
+
+    @classmethod
+    def from_parameters(cls, parameters, fs: float, n_stimuli: int, duration: float, **kwargs):
+        """
+        Session repeating the stimulus of the settings grid, every ear on its own channel
+        :param parameters: Parameters.StimulusParameters
+        :param fs: float
+        :param n_stimuli: int, e.g. DockContainer.n_stimuli
+        :param duration: float, e.g. DockContainer.stimuli_duration
+        :param kwargs: see SessionScheduler
+        :return: SessionScheduler
+        """
+        return cls([parameters.channel_tables()], fs, duration, repetitions=n_stimuli, **kwargs)
+
+    def stimulus(self, index: int) -> np.ndarray:
+        """
+        Returns the read-only (frames, channels) waveform of a stimulus, synthesized on the first request
+        :param index: int
+        :return: np.ndarray
+        """
+        if self.current[0] == index:
+            return self.current[1]
+
+        frames = int(self.stimulus_frames[index])
+        tables = [None if table is None else PyWave.component_table(table) for table in self.stimuli[index]]
+        key = self.keys.get(index)
+        if key is None:
+            key = self.keys[index] = stimulus_key("channels/" + self.dtype.name, self.fs, frames,
+                                                  *[np.empty((0, 6)) if table is None else table for table in tables])
+
+        wave = self.cache.get(key, lambda: PyWave.synthesize_channels(tables, self.fs, frames, self.dtype))
+        self.current = (index, wave)
+        return wave
+
+    def blocks(self, block_size: int, out: np.ndarray = None):
+        """
+        Generator yielding the session as consecutive interleaved (block_size, channels) blocks, the last one
+        shorter. Only the block being yielded is rendered, a playback engine pulling from it keeps at most its ring
+        of blocks ahead of the device. A single buffer is reused, every block is only valid until the next one
+        :param block_size: int
+        :param out: np.ndarray, optional C-contiguous (block_size, channels) buffer of the session dtype
+        :return: generator of np.ndarray
+        """
+        if out is None:
+            out = np.empty((block_size, self.channels), dtype=self.dtype)
+        onsets, frames, stimuli = self.events["onset"], self.events["frames"], self.events["stimulus"]
+
+        event = 0
+        for start in range(0, self.frames, block_size):
+            stop = min(start + block_size, self.frames)
+            block = out[:stop - start]
+            block.fill(0)
+
+            while event < len(onsets) and onsets[event] + frames[event] <= start:
+                event += 1
+            k = event
+            while k < len(onsets) and onsets[k] < stop:
+                onset = int(onsets[k])
+                first, last = max(onset, start), min(onset + int(frames[k]), stop)
+                block[first - start:last - start] = self.stimulus(int(stimuli[k]))[first - onset:last - onset]
+                k += 1
+
+            self.frame = stop
+            yield block
+
+    def markers(self, start: int, stop: int) -> np.ndarray:
+        """
+        Returns the events with an onset between the frames start (included) and stop, e.g. to send the trigger
+        codes of the block just handed to the device
+        :param start: int
+        :param stop: int
+        :return: np.ndarray with EVENT_DTYPE
+        """
+        first, last = np.searchsorted(self.events["onset"], (start, stop))
+
+        return self.events[first:last]
+
+    def duration(self) -> float:
+        """
+        Returns the session length in seconds
+        :return: float
+        """
+        return self.frames / self.fs
+
+    def stats(self) -> dict:
+        """
+        Returns the session counters and the stimulus cache counters
+        :return: dict
+        """
+        return {"events": len(self.events), "stimuli": len(self.stimuli), "frames": self.frames,
+                "frames_rendered": self.frame, "stimuli_played": len(self.keys), "cache": self.cache.stats()}
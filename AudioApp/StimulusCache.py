@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import os
+import tempfile
+import numpy as np
+import PyWave
+
+CACHE_BYTES = 256 * 2 ** 20  # Default memory budget of the cached stimuli
+
+
+def stimulus_key(kind: str, *params) -> str:
+    """
+    Returns the content address of a stimulus, the hash of the active synthesis backend, its kind and every
+    parameter value. The backends round differently, their stimuli never share an address
+    :param kind: str
+    :param params: float or np.ndarray
+    :return: str
+    """
+    digest = hashlib.sha1(PyWave.BACKEND.encode())
+    digest.update(kind.encode())
+    for param in params:
+        array = np.asarray(param, dtype=np.float64)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+
+    return digest.hexdigest()
+
+
+def component_key(component: np.ndarray, fs: float, buffer_size: int) -> str:
+    """
+    Returns the content address of a single component stimulus, see StimulusCache.get_components
+    :param component: np.ndarray, one row of an (N, 6) component table
+    :param fs: float
+    :param buffer_size: int
+    :return: str
+    """
+    return stimulus_key("component", component, fs, buffer_size)
+
+
+class StimulusCache:
+
+    def __init__(self, max_bytes: int = CACHE_BYTES, directory: str = None):
+        """
+        Bounded LRU of read-only synthesized stimuli keyed on their full parameter set. When directory is given
+        the stimuli are also saved there as .npy files and memory mapped back on later misses, so a restart can
+        skip the synthesis
+
+        :param max_bytes: int
+        :param directory: str
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str, synthesize) -> np.ndarray:
+        """
+        Returns the cached stimulus of key, calling synthesize() to create it on a miss
+        :param key: str
+        :param synthesize: callable returning np.ndarray
+        :return: np.ndarray
+        """
+        with self.lock:
+            wave = self.entries.get(key)
+            if wave is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return wave
+            self.misses += 1
+
+        path = None if self.directory is None else os.path.join(self.directory, key + ".npy")
+        if path is not None and os.path.exists(path):
+            wave = np.load(path, mmap_mode="r")
+            with self.lock:
+                self.disk_hits += 1
+        else:
+            wave = synthesize()
+            wave.flags.writeable = False
+            if path is not None:
+                # Private temporary file renamed once complete: no partial files, concurrent misses never collide
+                with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as file:
+                    np.save(file, wave)
+                os.replace(file.name, path)
+
+        self.put(key, wave)
+        return wave
+
+    def put(self, key: str, wave: np.ndarray) -> None:
+        """
+        Stores wave, evicting the least recently used stimuli above max_bytes
+        :param key: str
+        :param wave: np.ndarray
+        :return: None
+        """
+        with self.lock:
+            if key in self.entries or wave.nbytes > self.max_bytes:
+                return
+
+            self.entries[key] = wave
+            self.bytes += wave.nbytes
+            while self.bytes > self.max_bytes:
+                key, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def get_wave(self, wave, kind: str = "AFM") -> np.ndarray:
+        """
+        Returns the AFMWave stimulus, kind is "AM", "FM" or "AFM". The key holds every parameter, the oscillator and
+        the synthesis backend
+        :param wave: AFMWave
+        :param kind: str
+        :return: np.ndarray
+        """
+        key = stimulus_key(kind, wave.getCarrierFrequency(), wave.getAmplitude(), wave.getAMFrequency(),
+                           wave.getAMDepth(), wave.getFMFrequency(), wave.getFMDepth(), wave.getFS(),
+                           wave.getBufferSize(), int(wave.getOscillator()), wave.getTableSize())
+
+        return self.get(key, getattr(wave, "get" + kind + "Wave"))
+
+    def get_components(self, components: np.ndarray, fs: float, buffer_size: int, keys=None) -> np.ndarray:
+        """
+        Returns the multi component stimulus, see PyWave.synthesize. Every component is cached on its own and the
+        stimulus is their sum, so editing one component only synthesizes that one again
+        :param components: np.ndarray
+        :param fs: float
+        :param buffer_size: int
+        :param keys: sequence of str, cache key of every component when the caller keeps them, see component_key
+        :return: np.ndarray
+        """
+        table = PyWave.component_table(components)
+        if keys is None:
+            keys = [component_key(component, fs, buffer_size) for component in table]
+
+        wave = np.zeros((buffer_size, 1), dtype=np.float32)
+        for key, component in zip(keys, table):
+            wave += self.get(key, lambda component=component: PyWave.synthesize(component[None], fs, buffer_size))
+
+        return wave
+
+    def clear(self) -> None:
+        """
+        Empties the memory tier, the files on disk are kept
+        :return: None
+        """
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters
+        :return: dict
+        """
+        return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                "evictions": self.evictions, "entries": len(self.entries), "bytes": self.bytes}
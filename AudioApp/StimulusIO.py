@@ -0,0 +1,227 @@
+import struct
+import numpy as np
+import PyWave
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+RIFF_LIMIT = 2 ** 32 - 1  # Larger files are written as RF64 (EBU Tech 3306)
+SAMPLE_TYPES = {"float32": (np.dtype("<f4"), WAVE_FORMAT_IEEE_FLOAT),
+                "float64": (np.dtype("<f8"), WAVE_FORMAT_IEEE_FLOAT),
+                "int16": (np.dtype("<i2"), WAVE_FORMAT_PCM)}
+
+
+def to_samples(block: np.ndarray, dtype: np.dtype, out: np.ndarray = None, dither: bool = False) -> np.ndarray:
+    """
+    Converts a float block in [-1, 1] into the file sample type. Integer types go through PyWave.quantize, which
+    clips and optionally dithers
+    :param block: np.ndarray
+    :param dtype: np.dtype
+    :param out: np.ndarray, optional C-contiguous buffer with the block shape and dtype
+    :param dither: bool, TPDF dither of the integer types
+    :return: np.ndarray
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        if out is None:
+            return np.asarray(block, dtype=dtype)
+        out[...] = block
+        return out
+
+    if out is None:
+        out = np.empty(block.shape, dtype=dtype)
+    return PyWave.quantize(block, out, dither)
+
+
+class RawWriter:
+
+    def __init__(self, path: str, channels: int, sample_type: str = "float32"):
+        """
+        Writes interleaved little endian (frames, channels) samples without any header
+
+        :param path: str
+        :param channels: int
+        :param sample_type: str, "float32", "float64" or "int16"
+        """
+        self.channels = channels
+        self.sample_type = sample_type
+        self.dtype = SAMPLE_TYPES[sample_type][0]
+        self.frames = 0
+        self.file = open(path, "wb")
+        self.buffer = None  # Conversion buffer reused while the block shape does not change
+
+    def write(self, block: np.ndarray) -> None:
+        """
+        Appends a (frames, channels) block, or a (frames,) block when there is a single channel. Blocks already in
+        the file sample type, e.g. synthesized with PyWave.synthesize(..., dtype=sample_type), are written without
+        any conversion
+        :param block: np.ndarray
+        :return: None
+        """
+        block = block.reshape(-1, self.channels)
+        if block.dtype == self.dtype and block.flags.c_contiguous:
+            samples = block
+        else:
+            if self.buffer is None or self.buffer.shape != block.shape:
+                self.buffer = np.empty(block.shape, dtype=self.dtype)
+            samples = to_samples(block, self.dtype, self.buffer)
+
+        self.file.write(samples.data)
+        self.frames += len(samples)
+
+    def close(self) -> None:
+
+        self.file.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+
+class WavWriter(RawWriter):
+
+    HEADER = 12 + 36 + 24 + 12 + 8  # RIFF, JUNK (room for ds64), fmt, fact and data chunk headers
+
+    def __init__(self, path: str, channels: int, fs: int, sample_type: str = "float32"):
+        """
+        Writes a WAV file in chunks, the sizes in the header are patched on close() and the file becomes
+        RF64 when it grows over 4 GiB
+
+        :param path: str
+        :param channels: int
+        :param fs: int
+        :param sample_type: str, "float32", "float64" or "int16"
+        """
+        super(WavWriter, self).__init__(path, channels, sample_type)
+
+        self.fs = int(fs)
+        self.format = SAMPLE_TYPES[sample_type][1]
+        self.file.write(self.header(0))
+
+    def header(self, data_bytes: int) -> bytes:
+        """
+        Returns the file header for data_bytes bytes of samples
+        :param data_bytes: int
+        :return: bytes
+        """
+        width = self.dtype.itemsize
+        rf64 = self.HEADER - 8 + data_bytes > RIFF_LIMIT
+        riff_size = self.HEADER - 8 + data_bytes
+
+        header = struct.pack("<4sI4s", b"RF64" if rf64 else b"RIFF", RIFF_LIMIT if rf64 else riff_size, b"WAVE")
+        if rf64:
+            header += struct.pack("<4sIQQQI", b"ds64", 28, riff_size, data_bytes, self.frames, 0)
+        else:
+            header += struct.pack("<4sI28x", b"JUNK", 28)
+        header += struct.pack("<4sIHHIIHH", b"fmt ", 16, self.format, self.channels, self.fs,
+                              self.fs * self.channels * width, self.channels * width, 8 * width)
+        header += struct.pack("<4sII", b"fact", 4, min(self.frames, RIFF_LIMIT))
+        header += struct.pack("<4sI", b"data", RIFF_LIMIT if rf64 else data_bytes)
+
+        return header
+
+    def close(self) -> None:
+
+        if not self.file.closed:
+            self.file.seek(0)
+            self.file.write(self.header(self.frames * self.channels * self.dtype.itemsize))
+        super(WavWriter, self).close()
+
+
+def stereo_blocks(left, right, out: np.ndarray = None):
+    """
+    Generator interleaving two mono block streams into (frames, 2) blocks, reusing a single buffer. Prefer
+    PyWave.stream_channels, which synthesizes every channel in place instead of copying
+    :param left: iterable of np.ndarray
+    :param right: iterable of np.ndarray
+    :param out: np.ndarray, optional (frames, 2) buffer
+    :return: generator of np.ndarray
+    """
+    for l_block, r_block in zip(left, right):
+        if out is None or len(out) != l_block.size:
+            out = np.empty((l_block.size, 2), dtype=np.float32)
+        out[:, 0] = l_block.reshape(-1)
+        out[:, 1] = r_block.reshape(-1)
+        yield out
+
+
+def write_stream(path: str, blocks, channels: int, fs: int = None, sample_type: str = "float32") -> int:
+    """
+    Writes every block of a synthesis stream to a WAV file, or to a raw file when fs is None,
+    keeping only one block in memory. Returns the number of frames written
+    :param path: str
+    :param blocks: iterable of (frames, channels) np.ndarray, e.g. PyWave.stream or PyWave.stream_channels
+    :param channels: int
+    :param fs: int
+    :param sample_type: str, "float32", "float64" or "int16"
+    :return: int
+    """
+    writer = RawWriter(path, channels, sample_type) if fs is None else WavWriter(path, channels, fs, sample_type)
+    with writer:
+        for block in blocks:
+            writer.write(block)
+
+    return writer.frames
+
+
+def read_raw(path: str, channels: int, sample_type: str = "float32", mode: str = "r") -> np.memmap:
+    """
+    Memory maps a raw file as a (frames, channels) array
+    :param path: str
+    :param channels: int
+    :param sample_type: str, "float32", "float64" or "int16"
+    :param mode: str, np.memmap mode
+    :return: np.memmap
+    """
+    return np.memmap(path, dtype=SAMPLE_TYPES[sample_type][0], mode=mode).reshape(-1, channels)
+
+
+def read_wav(path: str, mode: str = "r") -> (int, np.memmap):
+    """
+    Memory maps the samples of a PCM int16, float32 or float64 WAV / RF64 file as a (frames, channels) array
+    :param path: str
+    :param mode: str, np.memmap mode
+    :return: tuple with the format (int, np.memmap)
+    """
+    with open(path, "rb") as file:
+        riff, size, wave = struct.unpack("<4sI4s", file.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ValueError("{} is not a WAV file".format(path))
+
+        data_bytes = None
+        audio_format = bits = channels = fs = None  # Set by the fmt chunk, which must come before the data
+        while True:
+            chunk = file.read(8)
+            if len(chunk) < 8:
+                raise ValueError("{} has no data chunk".format(path))
+            name, size = struct.unpack("<4sI", chunk)
+
+            if name == b"ds64":
+                data_bytes = struct.unpack("<QQ", file.read(16))[1]
+                file.seek(size - 16, 1)
+            elif name == b"fmt ":
+                audio_format, channels, fs = struct.unpack("<HHI", file.read(8))
+                bits = struct.unpack("<6xH", file.read(8))[0]
+                file.seek(size - 16 + size % 2, 1)
+            elif name == b"data":
+                if audio_format is None:
+                    raise ValueError("{} has no fmt chunk".format(path))
+                offset = file.tell()
+                if data_bytes is None or size != RIFF_LIMIT:
+                    data_bytes = size
+                break
+            else:
+                file.seek(size + size % 2, 1)
+
+    sample_type = {(WAVE_FORMAT_IEEE_FLOAT, 32): "float32", (WAVE_FORMAT_IEEE_FLOAT, 64): "float64",
+                   (WAVE_FORMAT_PCM, 16): "int16"}.get((audio_format, bits))
+    if sample_type is None:
+        raise ValueError("{} has an unsupported sample format".format(path))
+
+    dtype = SAMPLE_TYPES[sample_type][0]
+    frames = data_bytes // (dtype.itemsize * channels)
+
+    return fs, np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(frames, channels))
@@ -98,12 +98,8 @@ class FrequencyPicker(QMainWindow):
     def closeEvent(self, e):
 
         if self.ok and self.value is not "" and not self.closed:
-            self.parent().setText(self.value)
             parent = self.parent().parent()
-            parent.parent().preview_fft_left.plot()
-            parent.parent().preview_fft_right.plot()
-            parent.parent().preview_expected_left.plot()
-            parent.parent().preview_expected_right.plot()
+            parent.parent().parameter_changed(self.parent(), self.value)
             self.closed = True
             e.accept()
 
@@ -157,12 +153,8 @@ class ModulationPicker(QMainWindow):
     def closeEvent(self, e):
 
         if self.ok and self.value is not "" and not self.closed:
-            self.parent().setText(self.value)
             parent = self.parent().parent()
-            parent.parent().preview_fft_left.plot()
-            parent.parent().preview_fft_right.plot()
-            parent.parent().preview_expected_left.plot()
-            parent.parent().preview_expected_right.plot()
+            parent.parent().parameter_changed(self.parent(), self.value)
             self.closed = True
             e.accept()
 
@@ -216,12 +208,8 @@ class AMPercentagePicker(QMainWindow):
     def closeEvent(self, e):
 
         if self.ok and self.value is not "" and not self.closed:
-            self.parent().setText(self.value)
             parent = self.parent().parent()
-            parent.parent().preview_fft_left.plot()
-            parent.parent().preview_fft_right.plot()
-            parent.parent().preview_expected_left.plot()
-            parent.parent().preview_expected_right.plot()
+            parent.parent().parameter_changed(self.parent(), self.value)
             self.closed = True
             e.accept()
 
@@ -275,12 +263,8 @@ class FMPercentagePicker(QMainWindow):
     def closeEvent(self, e):
 
         if self.ok and self.value is not "" and not self.closed:
-            self.parent().setText(self.value)
             parent = self.parent().parent()
-            parent.parent().preview_fft_left.plot()
-            parent.parent().preview_fft_right.plot()
-            parent.parent().preview_expected_left.plot()
-            parent.parent().preview_expected_right.plot()
+            parent.parent().parameter_changed(self.parent(), self.value)
             self.closed = True
             e.accept()
 
@@ -334,12 +318,8 @@ class FMPhasePicker(QMainWindow):
     def closeEvent(self, e):
 
         if self.ok and self.value is not "" and not self.closed:
-            self.parent().setText(self.value)
             parent = self.parent().parent()
-            parent.parent().preview_fft_left.plot()
-            parent.parent().preview_fft_right.plot()
-            parent.parent().preview_expected_left.plot()
-            parent.parent().preview_expected_right.plot()
+            parent.parent().parameter_changed(self.parent(), self.value)
             self.closed = True
             e.accept()
 
@@ -393,12 +373,8 @@ class AmplitudePicker(QMainWindow):
     def closeEvent(self, e):
 
         if self.ok and self.value is not "" and not self.closed:
-            self.parent().setText(self.value)
             parent = self.parent().parent()
-            parent.parent().preview_fft_left.plot()
-            parent.parent().preview_fft_right.plot()
-            parent.parent().preview_expected_left.plot()
-            parent.parent().preview_expected_right.plot()
+            parent.parent().parameter_changed(self.parent(), self.value)
             self.closed = True
             e.accept()
 
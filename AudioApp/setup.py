@@ -0,0 +1,13 @@
+"""
+Builds the PyWave.PyAFM extension for the running interpreter, in place with:
+    python setup.py build_ext --inplace
+"""
+import numpy
+from setuptools import setup, Extension
+
+setup(
+    name="PyWave",
+    packages=["PyWave"],
+    ext_modules=[Extension("PyWave.PyAFM", sources=["PyWave/PyAFM.cpp"], depends=["PyWave/AFMKernels.h"],
+                           include_dirs=[numpy.get_include()], language="c++")],
+)
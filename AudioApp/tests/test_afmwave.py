@@ -0,0 +1,23 @@
+import unittest
+import numpy as np
+import PyWave
+
+
+class ZeroFMTest(unittest.TestCase):
+
+    def test_exact_waves_without_fm(self):
+        for name, module in PyWave.BACKENDS.items():
+            wave = module.AFMWave(1000, 1, 4096)
+            wave.setFS(44100)
+            wave.setAMFrequency(40)
+            wave.setAMDepth(1)
+            with self.subTest(backend=name):
+                fm, afm, am = wave.getFMWave(), wave.getAFMWave(), wave.getAMWave()
+                self.assertTrue(np.isfinite(fm).all())
+                self.assertTrue(np.isfinite(afm).all())
+                np.testing.assert_allclose(fm[:, 0], np.sin(2 * np.pi * 1000 / 44100 * np.arange(4096)), atol=1e-4)
+                np.testing.assert_allclose(afm, am, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+import numpy as np
+from Scheduler import compile_events
+
+
+class CompileEventsTest(unittest.TestCase):
+
+    def test_repetitions_of_shuffled_orders(self):
+        for order in ("blocked", "random"):
+            for seed in range(20):
+                events = compile_events([10, 20, 30], 3, order=order, rng=np.random.default_rng(seed))
+                for stimulus in range(3):
+                    presentations = events[events["stimulus"] == stimulus]
+                    np.testing.assert_array_equal(presentations["repetition"], np.arange(3))
+
+    def test_blocked_repetitions_follow_the_blocks(self):
+        events = compile_events([10, 20, 30], 4, order="blocked", rng=np.random.default_rng(0))
+        np.testing.assert_array_equal(events["repetition"], np.repeat(np.arange(4), 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
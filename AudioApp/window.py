@@ -3,32 +3,79 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QTabWidget, QAc
                              QMessageBox, QGroupBox, QDesktopWidget, QCheckBox)
 from PyQt5.QtCore import Qt
 import sys
-from PyWave.PyAFM import AFMWave
+from PyWave import AFMWave
 import Calc
+from Preview import PreviewPipeline, LEFT, RIGHT
+from Parameters import StimulusParameters
 from ValuePickers import *
 import numpy as np
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
-import scipy.fftpack
-import random
+from collections import deque
+import time
+
+try:
+    import pyqtgraph as pg
+except ImportError:
+    pg = None
+
+PLOT_BACKEND = "matplotlib"  # Backend used by the preview plots, "matplotlib" or "pyqtgraph"
+
+
+if pg is not None:
+    class PaintedPlotWidget(pg.PlotWidget):
+
+        def __init__(self, on_paint, **kwargs):
+            """
+            pyqtgraph plot that calls on_paint(e) after every repaint, the counterpart of the draw_event of the
+            matplotlib canvas
+
+            :param on_paint: callable
+            :param kwargs: see pyqtgraph.PlotWidget
+            """
+            super(PaintedPlotWidget, self).__init__(**kwargs)
+
+            self.on_paint = on_paint
+
+        def paintEvent(self, e):
+
+            super(PaintedPlotWidget, self).paintEvent(e)
+            self.on_paint(e)
 
 
 class PlotWidget(QWidget):
 
-    def __init__(self, parent=None):
-        
+    def __init__(self, parent=None, backend: str = PLOT_BACKEND):
+        """
+        Preview plot that keeps a single persistent line and only updates its data on every plot() call
+
+        :param parent: Widget
+        :param backend: str, "matplotlib" or "pyqtgraph" (falls back to matplotlib when it is not installed)
+        """
         super(PlotWidget, self).__init__(parent=parent, flags=Qt.Widget)
 
-        # Setting up graph style
-        plt.style.use("grayscale")
-        plt.rcParams['axes.facecolor'] = "61656b"
-        plt.rcParams['figure.facecolor'] = "61656b"
-        plt.rcParams.update({"font.size": 8})
+        self.backend = backend if pg is not None else "matplotlib"
+        self.frame_times = deque(maxlen=100)  # Seconds from each plot() call until the canvas painted the new frame
+        self.plot_time = None
 
-        # Starting Figure and Canvas
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
+        if self.backend == "pyqtgraph":
+            self.canvas = PaintedPlotWidget(self.on_draw, background="#61656b")
+            self.line = self.canvas.plot(pen="w")
+
+        else:
+            # Setting up graph style
+            plt.style.use("grayscale")
+            plt.rcParams['axes.facecolor'] = "61656b"
+            plt.rcParams['figure.facecolor'] = "61656b"
+            plt.rcParams.update({"font.size": 8})
+
+            # Starting Figure, Canvas and the persistent line
+            self.figure = Figure()
+            self.canvas = FigureCanvas(self.figure)
+            self.axes = self.figure.add_subplot(111)
+            self.line, = self.axes.plot([], [], "-")
+            self.canvas.mpl_connect("draw_event", self.on_draw)
 
         # Setting up the layout
         self.vertical_layout = QVBoxLayout()
@@ -38,14 +85,41 @@ class PlotWidget(QWidget):
 
         self.plot()  # Plot data
 
-    def plot(self):
+    def plot(self, y: np.ndarray = None, x: np.ndarray = None) -> None:
+        """
+        Replaces the line data, random data is shown when y is None
+        :param y: np.ndarray
+        :param x: np.ndarray, defaults to the sample index
+        :return: None
+        """
+        self.plot_time = time.perf_counter()
+
+        if y is None:
+            y = np.random.random(50)
+        if x is None:
+            x = np.arange(len(y))
+
+        if self.backend == "pyqtgraph":
+            self.line.setData(x, y)  # Schedules the repaint of the item, timed in on_draw like matplotlib
 
-        data = [random.random() for i in range(50)]
+        else:
+            self.line.set_data(x, y)
+            self.axes.relim()
+            self.axes.autoscale_view()
+            self.canvas.draw_idle()  # Coalesces several updates into one repaint
+
+    def on_draw(self, e) -> None:
 
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        ax.plot(data, "-")
-        self.canvas.draw()
+        if self.plot_time is not None:
+            self.frame_times.append(time.perf_counter() - self.plot_time)
+            self.plot_time = None
+
+    def frame_time(self) -> float:
+        """
+        Returns the mean frame time in seconds of the last updates
+        :return: float
+        """
+        return float(np.mean(self.frame_times)) if self.frame_times else 0.
 
 
 class DockElement(QWidget):
@@ -147,10 +221,10 @@ class DockContainer(QWidget):
         wave.setAMDepth(self.am_depth_element.get_value())
         wave.setFS(self.fs_element.get_value())
 
-        frq, yf = Calc.calc_fft(wave.getAMWave(), wave.getBufferSize(), wave.getFS())
+        frq, yf, magnitude = Calc.calc_rfft(wave.getAMWave(), wave.getBufferSize(), wave.getFS())
 
         fig, ax = plt.subplots(2)
-        ax[0].plot(frq[:wave.getBufferSize() // 2], abs(yf[:wave.getBufferSize() // 2]))
+        ax[0].plot(frq, magnitude)
         ax[1].plot(wave.getAMWave())
 
         plt.show()
@@ -226,6 +300,10 @@ class SettingsTabWidget(QWidget):
         self.preview_expected_left = PlotWidget(self)  # Left expected result preview
         self.preview_expected_right = PlotWidget(self)  # Right expected result preview
 
+        self.parameters = StimulusParameters()  # Values of the parameter buttons
+        self.preview = PreviewPipeline(parent=self)  # Computes the previews off the GUI thread
+        self.preview_errors = [None, None]  # Status bar message of the last failed preview of each ear
+
         self.enable_left = QCheckBox()  # Checkbox that will enable/disable the left components
         self.enable_right = QCheckBox()  # Checkbox that will enable/disable the right components
 
@@ -486,6 +564,21 @@ class SettingsTabWidget(QWidget):
         # Set self layout as horizontal_layout
         self.setLayout(self.vertical_layout)
 
+        self.preview.finished.connect(self.show_preview)
+        self.preview.failed.connect(self.show_preview_error)
+
+        # Bind every parameter button to its (ear, component, field) cell of the parameters model
+        self.cells = {}
+        for ear, columns in enumerate(((self.left_buttons_frequency, self.left_buttons_modulation,
+                                        self.left_buttons_am_deepness, self.left_buttons_fm_deepness,
+                                        self.left_buttons_fm_phase, self.left_buttons_amplitude),
+                                       (self.right_buttons_frequency, self.right_buttons_modulation,
+                                        self.right_buttons_am_deepness, self.right_buttons_fm_deepness,
+                                        self.right_buttons_fm_phase, self.right_buttons_amplitude))):
+            for field, buttons in enumerate(columns):
+                for component, button in enumerate(buttons):
+                    self.cells[button] = (ear, component, field)
+
         self.show()  # Set self visible
 
     def on_click_frequency(self):
@@ -517,6 +610,88 @@ class SettingsTabWidget(QWidget):
         btn = self.sender()
         AmplitudePicker(btn)
 
+    def parameter_changed(self, button: QPushButton, text: str) -> None:
+        """
+        Called by the value pickers, stores the value in the parameters model, updates the button label and
+        schedules the preview of the ear the button belongs to. Values that are not numbers are rejected with a
+        message, the button keeps its previous value
+        :param button: QPushButton
+        :param text: str
+        :return: None
+        """
+        ear, component, field = self.cells[button]
+        value = parse_value(text, np.nan)
+        if np.isnan(value):
+            previous = self.parameters.get(ear, component, field)
+            message = "Rejected \"{}\": not a number, {}".format(
+                text, "the cell stays empty" if np.isnan(previous) else "{} is kept".format(button.text()))
+            status_bar = self.status_bar()
+            if status_bar is not None:
+                status_bar.showMessage(message, 5000)
+            else:
+                QMessageBox.warning(self, "Invalid value", message)
+            return
+
+        self.parameters.set(ear, component, field, value)
+        button.setText(text)
+        self.request_preview(ear)
+
+    def request_preview(self, ear: int) -> None:
+        """
+        Schedules the ear preview, unchanged parameters are skipped by the pipeline and only the dirty components
+        are synthesized again
+        :param ear: int
+        :return: None
+        """
+        self.preview.request(ear, self.parameters.component_table(ear), self.parameters.ear_version[ear],
+                             self.parameters.component_indices(ear), self.parameters.dirty_components(ear))
+        self.parameters.clear(ear)
+
+    def show_preview(self, ear: int, wave: np.ndarray, frq: np.ndarray, magnitude: np.ndarray) -> None:
+        """
+        Receives the pipeline results in the GUI thread
+        :param ear: int
+        :param wave: np.ndarray
+        :param frq: np.ndarray
+        :param magnitude: np.ndarray
+        :return: None
+        """
+        if ear == LEFT:
+            self.preview_fft_left.plot(magnitude, frq)
+            self.preview_expected_left.plot(wave)
+        else:
+            self.preview_fft_right.plot(magnitude, frq)
+            self.preview_expected_right.plot(wave)
+
+        # The ear previews again, take down its error unless another message replaced it
+        status_bar = self.status_bar()
+        if status_bar is not None and self.preview_errors[ear] is not None:
+            if status_bar.currentMessage() == self.preview_errors[ear]:
+                status_bar.clearMessage()
+            self.preview_errors[ear] = None
+
+    def show_preview_error(self, ear: int, message: str) -> None:
+        """
+        Receives the pipeline errors in the GUI thread and shows them in the status bar until the next preview of
+        the ear succeeds
+        :param ear: int
+        :param message: str
+        :return: None
+        """
+        status_bar = self.status_bar()
+        if status_bar is not None:
+            self.preview_errors[ear] = "{} ear preview failed: {}".format("Left" if ear == LEFT else "Right", message)
+            status_bar.showMessage(self.preview_errors[ear])
+
+    def status_bar(self):
+        """
+        Returns the status bar of the main window, None when the tab is not shown in one
+        :return: QStatusBar
+        """
+        window = self.window()
+
+        return window.statusBar() if isinstance(window, QMainWindow) else None
+
     def test_event(self):
         print(self.right_group.size())
 
@@ -530,6 +705,10 @@ class SettingsTabWidget(QWidget):
 
     def change_check(self):
         check = self.sender()
+        ear = LEFT if check is self.enable_left else RIGHT
+        self.parameters.set_enabled(ear, check.isChecked())
+        self.request_preview(ear)
+
         if check is self.enable_left:
             if not self.enable_left.checkState():
                 for b1, b2, b3, b4, b5, b6 in zip(self.left_buttons_frequency, self.left_buttons_amplitude,
@@ -701,11 +880,25 @@ class MainWindow(QMainWindow):
                                      QMessageBox.Yes, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
+            self.central_widget.settings_tab.preview.shutdown()
             e.accept()
         else:
             e.ignore()
 
 
+def parse_value(text: str, default: float) -> float:
+    """
+    Converts a parameter value to float, returning default for invalid values
+    :param text: str
+    :param default: float
+    :return: float
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return default
+
+
 def get_style() -> str:
     """
     Read the style file and return its contents